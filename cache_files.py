@@ -0,0 +1,54 @@
+# Copyright 2015 Altova GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+__copyright__ = "Copyright 2015 Altova GmbH"
+__license__ = 'http://www.apache.org/licenses/LICENSE-2.0'
+__version__ = '1.0'
+
+# This module implements the file helpers shared by the caches of the efm_validation.py and dqc_validation.py scripts.
+# Files are identified by a stamp made of their modification time and size, which is checked on each use of a cached result. Members of zip archives get the stamp of the archive.
+# Cache files are written to a temporary file which then replaces the cache file, so that concurrent processes never read a partially written cache. If the file cannot be written the previous cache file is left in place.
+
+import os
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+def file_stamp(path):
+    """Returns a (mtime, size) tuple identifying the state of a local file or None if the file cannot be accessed."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns,st.st_size)
+
+def uri_stamp(uri):
+    """Returns the file_stamp of a file uri or None for other uris. Members of zip archives (e.g. file:/path/filing.zip|zip/image.jpg) get the stamp of the archive."""
+    parts = urlparse(uri)
+    if parts.scheme != 'file':
+        return None
+    return file_stamp(url2pathname(parts.path).split('|zip/',1)[0])
+
+def write_atomic(path,write,mode='w'):
+    """Calls write with a temporary file opened in the given mode and replaces path with it. Returns False if the file could not be written."""
+    tmp_path = '%s.%d.tmp' % (path,os.getpid())
+    try:
+        with open(tmp_path,mode) as f:
+            write(f)
+        os.replace(tmp_path,path)
+        return True
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
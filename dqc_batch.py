@@ -0,0 +1,203 @@
+# Copyright 2015 Altova GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+__copyright__ = 'Copyright 2015 Altova GmbH'
+__license__ = 'http://www.apache.org/licenses/LICENSE-2.0'
+
+# Validates a batch of SEC EDGAR filings with the DQC rules implemented in dqc_validation.py.
+#
+# This script drives Altova RaptorXML+XBRL to validate all filings in the given directories, glob patterns, EDGAR zip archives or instance files.
+# The filings are distributed to a pool of worker processes, each of which loads the DQC reference data once and keeps it for all filings it validates.
+# The DQC errors are written as JSON lines with the filing, the error code, the fact and the message as soon as the validation of a filing has finished.
+#
+# Example usage:
+#
+# Show available options
+#   raptorxmlxbrl script dqc_batch.py -h
+# Validate all filings in a directory
+#   raptorxmlxbrl script dqc_batch.py /path/to/filings --output dqc_errors.jsonl
+# Validate EDGAR zip archives with 8 worker processes and suppress a rule family
+#   raptorxmlxbrl script dqc_batch.py "/path/to/archives/*.zip" --workers 8 --suppress-errors "DQC.US.0015.*" --output dqc_errors.jsonl
+
+import altova_api.v2.xml as xml
+import altova_api.v2.xbrl as xbrl
+
+import argparse,concurrent.futures,glob,json,logging,multiprocessing,os,re,sys,time,urllib.request,zipfile
+
+sys.path.append(os.path.dirname(__file__))
+import dqc_reference_data
+import dqc_validation
+import label_cache
+
+re_instance_name = re.compile(r'.+-\d{8}\.xml')
+
+def instance_name_from_zip(path):
+    """Determines the instance filename within a SEC EDGAR zip archive or returns None if there is no such file."""
+    with zipfile.ZipFile(path) as archive:
+        for name in archive.namelist():
+            if re_instance_name.fullmatch(name):
+                return name
+    return None
+
+def filing_uri(path):
+    """Returns the uri of the instance of the filing in the given EDGAR zip archive or instance file or None if the file is not a filing."""
+    if path.lower().endswith('.zip'):
+        name = instance_name_from_zip(path)
+        return 'file:{0}%7Czip/{1}'.format(urllib.request.pathname2url(os.path.abspath(path)),name) if name else None
+    if re_instance_name.fullmatch(os.path.basename(path)):
+        return 'file:'+urllib.request.pathname2url(os.path.abspath(path))
+    return None
+
+def filing_paths(inputs):
+    """Yields the paths of all EDGAR zip archives and instance files in the given directories, glob patterns or files."""
+    for path in inputs:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    yield os.path.join(dirpath,filename)
+        elif glob.has_magic(path):
+            yield from sorted(glob.glob(path,recursive=True))
+        else:
+            yield path
+
+def filings(inputs):
+    """Yields (filing, uri) tuples for all filings in the given inputs. The filing is the path of the zip archive or instance file."""
+    for path in filing_paths(inputs):
+        try:
+            uri = filing_uri(path)
+        except (OSError,zipfile.BadZipFile):
+            logging.warning('Skipping unreadable file %s',path)
+            continue
+        if uri:
+            yield path, uri
+
+# Script parameters passed to dqc_validation.validate() in each worker process
+_params = None
+
+def init_worker(params):
+    """Initializes a worker process. The DQC reference data is loaded once per process and shared by all filings validated in it."""
+    global _params
+    _params = params
+    dqc_reference_data.load()
+
+def fact_info(fact):
+    """Returns a dict identifying the given fact."""
+    info = {'concept': str(fact.qname), 'contextRef': fact.contextRef}
+    if isinstance(fact,xbrl.Item):
+        if fact.unitRef:
+            info['unitRef'] = fact.unitRef
+        info['value'] = None if fact.xsi_nil else fact.normalized_value
+    return info
+
+def validate_filing(filing,uri):
+    """Validates the filing and returns a list of result dicts for each DQC error or for the XBRL validation errors if the instance is not valid."""
+    instance, error_log = xbrl.Instance.create_from_url(uri,error_limit=200)
+    if not instance:
+        return [{'filing': filing, 'rule': None, 'fact': None, 'message': error.text} for error in error_log if error.severity == xml.ErrorSeverity.ERROR]
+
+    dqc_error_log = dqc_validation.DeferredErrorLog()
+    dqc_validation.validate(instance,dqc_error_log,_params)
+    results = []
+    with label_cache.scope():
+        for rule_id, kargs in dqc_error_log.entries:
+            results.append({'filing': filing, 'rule': rule_id, 'fact': fact_info(kargs['fact1']), 'message': dqc_validation.render_error(rule_id,kargs,dqc_error_log.periods).text})
+    return results
+
+def run_batch(args,output):
+    """Validates all filings on a process pool and writes the results to output as JSON lines in the order in which the filings finish. Returns the number of filings and the number of failed filings."""
+    params = {}
+    if args.suppress_errors:
+        params['suppressErrors'] = args.suppress_errors
+    if args.enable_rules:
+        params['enableRules'] = args.enable_rules
+    if args.disable_rules:
+        params['disableRules'] = args.disable_rules
+    if args.fact_store:
+        params['factStore'] = 'true'
+
+    total = 0
+    failed = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.max_workers,initializer=init_worker,initargs=(params,)) as executor:
+        # Keep only a bounded number of filings in flight, so that huge batches do not queue all filings at once
+        pending = {}
+        filing_iter = filings(args.inputs)
+        while True:
+            for filing, uri in filing_iter:
+                pending[executor.submit(validate_filing,filing,uri)] = filing
+                total += 1
+                if len(pending) >= args.max_workers*4:
+                    break
+            if not pending:
+                break
+
+            done, not_done = concurrent.futures.wait(pending,return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                filing = pending.pop(future)
+                try:
+                    results = future.result()
+                except:
+                    failed += 1
+                    logging.exception('Exception raised during validation of filing %s:',filing)
+                    continue
+                for result in results:
+                    output.write(json.dumps(result)+'\n')
+                output.flush()
+                logging.info('Finished validating filing %s: %d errors',filing,len(results))
+
+    return total, failed
+
+def setup_logging(args):
+    """Initializes Python logging module."""
+    if args.log_file:
+        levels = {'ERROR': logging.ERROR, 'WARNING': logging.WARNING, 'INFO': logging.INFO, 'DEBUG': logging.DEBUG}
+        logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s',filename=args.log_file,filemode='w',level=levels[args.log_level])
+    else:
+        logging.getLogger().addHandler(logging.NullHandler())
+    console = logging.StreamHandler()
+    console.setLevel(logging.WARNING)
+    console.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+    logging.getLogger().addHandler(console)
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Validate SEC EDGAR filings with the XBRL US DQC rules using Altova RaptorXML+XBRL')
+    parser.add_argument('inputs', metavar='INPUT', nargs='+', help='directory, glob pattern, EDGAR zip archive or instance file')
+    parser.add_argument('-o','--output', metavar='OUTPUT_FILE', dest='output_file', help='write the DQC errors as JSON lines to this file (default stdout)')
+    parser.add_argument('-l','--log', metavar='LOG_FILE', dest='log_file', help='log output file')
+    parser.add_argument('--log-level', metavar='LOG_LEVEL', dest='log_level', choices=['ERROR','WARNING','INFO','DEBUG'], default='INFO', help='log level (ERROR|WARNING|INFO|DEBUG)')
+    parser.add_argument('-w','--workers', metavar='MAX_WORKERS', type=int, dest='max_workers', default=multiprocessing.cpu_count(), help='limit number of worker processes')
+    parser.add_argument('--suppress-errors', metavar='CODES', dest='suppress_errors', help='DQC.US.nnnn.mmm error codes or DQC.US.nnnn rule families separated by |')
+    parser.add_argument('--enable-rules', metavar='RULES', dest='enable_rules', help='DQC.US.nnnn rules separated by | which are executed exclusively')
+    parser.add_argument('--disable-rules', metavar='RULES', dest='disable_rules', help='DQC.US.nnnn rules separated by | which are not executed')
+    parser.add_argument('--fact-store', dest='fact_store', action='store_true', help='evaluate the supported rules on a columnar fact store (requires numpy)')
+    return parser.parse_args()
+
+def main():
+    # Parse command line arguments
+    args = parse_args()
+
+    # Setup logging
+    setup_logging(args)
+
+    # Validate the filings
+    start = time.time()
+    if args.output_file:
+        with open(args.output_file,'w') as output:
+            total, failed = run_batch(args,output)
+    else:
+        total, failed = run_batch(args,sys.stdout)
+    logging.info('Finished validating %d filings (%d failed) in %fs',total,failed,time.time()-start)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,453 @@
+# Copyright 2015 Altova GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+__copyright__ = "Copyright 2015 Altova GmbH"
+__license__ = 'http://www.apache.org/licenses/LICENSE-2.0'
+__version__ = '1.0'
+
+# This module implements a columnar store of the item facts of a filing on which the DQC rules 0004, 0009, 0015, 0033 and 0036 of dqc_validation.py are evaluated with vectorized NumPy operations.
+# A FactStore can be loaded from a JSON, CSV or Parquet fact dump, so that historical filings can be screened without parsing them with RaptorXML, or filled from an xbrl.Instance with from_instance().
+# dqc_validation.py uses the store for these rules if the factStore script parameter is set to true.
+#
+# Each fact of a dump is a record with the following fields:
+#
+#   concept         The concept name in Clark notation, e.g. {http://fasb.org/us-gaap/2015-01-31}Assets
+#   entity          The entity identifier as scheme|value
+#   start           The start date of a duration period (empty for instant and forever periods)
+#   end             The end date of a duration period or the instant date as written in the instance (empty for forever periods)
+#   dimensions      The dimension and member names in Clark notation as {ns}Axis={ns}Member pairs separated by blanks (a dict in JSON dumps)
+#   unit            A canonical string of the unit measures (empty for non-numeric facts)
+#   value           The normalized value of the fact
+#   decimals        The decimals of a numeric fact or INF (empty for non-numeric facts)
+#   nil             true if the fact is nil
+#   id              An optional identifier of the fact used in the findings
+#
+# Numeric values are stored as 64-bit floats, so values with more than 15 significant digits are compared approximately.
+#
+# NOTE: You must first download the source code of the 3rd party Python module numpy from https://pypi.python.org/pypi/numpy
+# and extract the numpy folder in the archive to the lib/python3.4 subfolder of the RaptorXML server installation directory.
+# Parquet dumps additionally require the 3rd party Python module pyarrow.
+#
+# Example invocation:
+#   python dqc_factstore.py filing1.json filing2.csv --suppress DQC.US.0015
+
+import argparse,collections,csv,json,os,sys
+
+try:
+    import numpy
+except ImportError:
+    raise ImportError('Please install the 3rd party python module numpy from https://pypi.python.org/pypi/numpy')
+
+sys.path.append(os.path.dirname(__file__))
+import dqc_reference_data
+
+# A finding of a DQC rule with the error code and a dict of the row indexes of the facts keyed by the message parameter names used in dqc_validation.py
+Finding = collections.namedtuple('Finding',['code','facts'])
+
+NaT = numpy.datetime64('NaT','D')
+
+def clark(namespace,local_name):
+    """Returns the name in Clark notation."""
+    return '{%s}%s' % (namespace,local_name)
+
+def split_clark(name):
+    """Returns the namespace and local name of a name in Clark notation."""
+    if name.startswith('{'):
+        namespace, local_name = name[1:].split('}',1)
+        return namespace, local_name
+    return '', name
+
+def _parse_date(value):
+    if not value:
+        return NaT
+    try:
+        return numpy.datetime64(str(value).strip()[:10],'D')
+    except ValueError:
+        return NaT
+
+def _parse_decimals(value):
+    if value is None or value == '':
+        return None
+    if value == 'INF' or value == float('inf'):
+        return float('inf')
+    return float(value)
+
+def _parse_dimensions(value):
+    if not value:
+        return ()
+    if isinstance(value,dict):
+        items = value.items()
+    else:
+        items = (item.split('=',1) for item in value.split())
+    return tuple(sorted((dim,member) for dim, member in items))
+
+def _parse_bool(value):
+    if isinstance(value,str):
+        return value.strip().lower() in ('1','true')
+    return bool(value)
+
+class FactStore(object):
+    """Columnar store of item facts. Concept names, dimension keys and the aspect keys used to join facts are interned and the facts hold their indexes in NumPy arrays."""
+
+    def __init__(self,records,sources=None):
+        concepts = {}
+        dimension_keys = {}
+        aspect_keys = {}
+        concept_col, start_col, end_col, dimensions_col, aspects_col = [], [], [], [], []
+        value_col, text_col, decimals_col, nil_col, ids = [], [], [], [], []
+
+        for record in records:
+            concept_col.append(concepts.setdefault(record['concept'],len(concepts)))
+            start = record.get('start') or ''
+            end = record.get('end') or ''
+            start_col.append(_parse_date(start))
+            end_col.append(_parse_date(end))
+            dims = dimension_keys.setdefault(_parse_dimensions(record.get('dimensions')),len(dimension_keys))
+            dimensions_col.append(dims)
+            unit = record.get('unit') or ''
+            aspects_col.append(aspect_keys.setdefault((record.get('entity',''),str(start),str(end),dims,unit),len(aspect_keys)))
+
+            nil = _parse_bool(record.get('nil',False))
+            decimals = _parse_decimals(record.get('decimals'))
+            text = '' if record.get('value') is None else str(record['value'])
+            value = float('nan')
+            if not nil and (decimals is not None or unit):
+                try:
+                    value = float(text)
+                except ValueError:
+                    pass
+            value_col.append(value)
+            text_col.append(text)
+            # Numeric facts without decimals are compared without rounding
+            decimals_col.append(float('inf') if decimals is None else decimals)
+            nil_col.append(nil)
+            ids.append(record.get('id') or str(len(ids)))
+
+        self.concepts = list(concepts)
+        self.concept_index = concepts
+        self.dimension_keys = list(dimension_keys)
+        self.concept = numpy.array(concept_col,dtype=numpy.int32)
+        self.start = numpy.array(start_col,dtype='datetime64[D]')
+        self.end = numpy.array(end_col,dtype='datetime64[D]')
+        self.dimensions = numpy.array(dimensions_col,dtype=numpy.int32)
+        self.aspects = numpy.array(aspects_col,dtype=numpy.int32)
+        self.value = numpy.array(value_col,dtype=numpy.float64)
+        self.text = numpy.array(text_col,dtype=object)
+        self.decimals = numpy.array(decimals_col,dtype=numpy.float64)
+        self.nil = numpy.array(nil_col,dtype=bool)
+        self.ids = ids
+        self.sources = sources
+
+        # Rows sorted by concept, so that the rows of a concept are a slice of self.by_concept
+        self.by_concept = numpy.argsort(self.concept,kind='stable')
+        self.concept_bounds = numpy.searchsorted(self.concept[self.by_concept],numpy.arange(len(self.concepts)+1))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self,concept):
+        """Returns an array with the row indexes of the facts of the given concept name in Clark notation in document order."""
+        index = self.concept_index.get(concept)
+        if index is None:
+            return numpy.empty(0,dtype=numpy.intp)
+        return self.by_concept[self.concept_bounds[index]:self.concept_bounds[index+1]]
+
+    def concept_mask(self,predicate):
+        """Returns a boolean array over all facts which is True for the facts whose concept namespace and local name satisfy predicate."""
+        selected = numpy.array([predicate(*split_clark(concept)) for concept in self.concepts],dtype=bool)
+        return selected[self.concept] if len(self.concepts) else numpy.zeros(len(self),dtype=bool)
+
+    def dimension_members(self,dimension):
+        """Returns an int array over all facts with the index of the member of the given dimension name in the returned list of members. Index 0 (None) is used for facts without the dimension."""
+        members = [None]
+        member_index = {None: 0}
+        key_members = numpy.zeros(len(self.dimension_keys),dtype=numpy.int32)
+        for i, key in enumerate(self.dimension_keys):
+            member = dict(key).get(dimension)
+            index = member_index.get(member)
+            if index is None:
+                index = member_index[member] = len(members)
+                members.append(member)
+            key_members[i] = index
+        return key_members[self.dimensions], members
+
+    def standard_namespaces(self):
+        """Returns a dict of prefix and namespace key/value pairs for the standard namespaces of the concepts of the facts."""
+        return dqc_reference_data.standard_namespaces({split_clark(concept)[0] for concept in self.concepts})
+
+    def describe(self,row):
+        """Returns a short text describing the fact in the given row."""
+        start, end = self.start[row], self.end[row]
+        period = '%s - %s' % (start,end) if not numpy.isnat(start) else ('forever' if numpy.isnat(end) else str(end))
+        dims = ', '.join('%s = %s' % (split_clark(dim)[1],split_clark(member)[1]) for dim, member in self.dimension_keys[self.dimensions[row]])
+        return '%s %s=%s [%s] %s' % (self.ids[row],split_clark(self.concepts[self.concept[row]])[1],'nil' if self.nil[row] else self.text[row],period,dims or 'none')
+
+def load_json(path):
+    """Returns a FactStore with the facts of a JSON dump containing either a list of fact records or an object with a facts member."""
+    with open(path) as f:
+        data = json.load(f)
+    return FactStore(data['facts'] if isinstance(data,dict) else data)
+
+def load_csv(path):
+    """Returns a FactStore with the facts of a CSV dump with a header row containing the field names."""
+    with open(path,newline='') as f:
+        return FactStore(list(csv.DictReader(f)))
+
+def load_parquet(path):
+    """Returns a FactStore with the facts of a Parquet dump."""
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Please install the 3rd party python module pyarrow from https://pypi.python.org/pypi/pyarrow')
+    return FactStore(pyarrow.parquet.read_table(path).to_pylist())
+
+def load(path):
+    """Returns a FactStore with the facts of the dump with the given path. The format is selected by the file extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return load_csv(path)
+    elif ext in ('.parquet','.pq'):
+        return load_parquet(path)
+    return load_json(path)
+
+def fact_records(instance):
+    """Yields a dump record for each item fact of a RaptorXML xbrl.Instance."""
+    import altova_api.v2.xbrl as xbrl
+    import datetime
+
+    contexts = {}
+    units = {}
+    for index, fact in enumerate(instance.facts):
+        if not isinstance(fact,xbrl.Item):
+            continue
+
+        context = contexts.get(fact.contextRef)
+        if context is None:
+            identifier = fact.context.entity.identifier
+            period = fact.period_aspect_value
+            # The period aspect values use midnight of the next day as end of the period
+            if period.period_type == xbrl.PeriodType.START_END:
+                start, end = period.start.date().isoformat(), (period.end-datetime.timedelta(days=1)).date().isoformat()
+            elif period.period_type == xbrl.PeriodType.INSTANT:
+                start, end = '', (period.instant-datetime.timedelta(days=1)).date().isoformat()
+            else:
+                start, end = '', ''
+            dimensions = {}
+            for dim_aspect in fact.context.dimension_aspect_values:
+                value = dim_aspect.value
+                dimensions[clark(dim_aspect.dimension.qname.namespace_name,dim_aspect.dimension.qname.local_name)] = clark(value.qname.namespace_name,value.qname.local_name) if isinstance(value,xbrl.taxonomy.Concept) else str(value)
+            context = {'entity': '%s|%s' % (identifier.scheme,identifier.value), 'start': start, 'end': end, 'dimensions': dimensions}
+            contexts[fact.contextRef] = context
+
+        unit = ''
+        if fact.unit:
+            unit = units.get(fact.unitRef)
+            if unit is None:
+                numerator = sorted(clark(measure.value.namespace_name,measure.value.local_name) for measure in fact.unit.numerator_measures)
+                denominator = sorted(clark(measure.value.namespace_name,measure.value.local_name) for measure in fact.unit.denominator_measures)
+                unit = '*'.join(numerator)+'/'+'*'.join(denominator)
+                units[fact.unitRef] = unit
+
+        record = dict(context)
+        record['concept'] = clark(fact.qname.namespace_name,fact.qname.local_name)
+        record['unit'] = unit
+        record['nil'] = fact.xsi_nil
+        record['value'] = None if fact.xsi_nil else fact.normalized_value
+        record['decimals'] = fact.decimals if fact.concept.is_numeric() and not fact.xsi_nil else None
+        record['id'] = str(index)
+        yield record
+
+def from_instance(instance):
+    """Returns a FactStore with the item facts of a RaptorXML xbrl.Instance. The sources attribute holds the xbrl.Item object of each row."""
+    import altova_api.v2.xbrl as xbrl
+    return FactStore(fact_records(instance),[fact for fact in instance.facts if isinstance(fact,xbrl.Item)])
+
+def write_json(records,path):
+    """Writes the given fact records as JSON dump."""
+    with open(path,'w') as f:
+        json.dump({'facts': [dict(record,decimals='INF' if record['decimals'] == float('inf') else record['decimals']) for record in records]},f)
+
+def is_suppressed(code,suppress_errors):
+    """Returns True if the error code or one of its rule family prefixes is in suppress_errors."""
+    parts = code.split('.')
+    return any('.'.join(parts[:i]) in suppress_errors for i in range(len(parts),0,-1))
+
+def round_decimals(values,decimals):
+    """Returns the values rounded to the given decimals using round half to nearest even. Values with infinite decimals are not rounded."""
+    finite = numpy.isfinite(decimals)
+    digits = numpy.where(finite,decimals,0)
+    scale = numpy.power(10.0,numpy.abs(digits))
+    # Dividing by the exact power of ten avoids the representation error of negative powers of ten for decimals < 0
+    rounded = numpy.where(digits < 0,numpy.rint(values/scale)*scale,numpy.rint(values*scale)/scale)
+    return numpy.where(finite,rounded,values)
+
+def compare_decimals(store,rows1,rows2):
+    """Returns the least accurate decimals of each pair of rows and the values of both rows rounded to them."""
+    decimals = numpy.minimum(store.decimals[rows1],store.decimals[rows2])
+    return decimals, round_decimals(store.value[rows1],decimals), round_decimals(store.value[rows2],decimals)
+
+def join(store,rows1,rows2):
+    """Returns two arrays with the rows of all pairs of non-nil facts of rows1 and rows2 with equal aspects except the concept (entity, period, dimensions and unit)."""
+    rows1 = rows1[~store.nil[rows1]]
+    rows2 = rows2[~store.nil[rows2]]
+    if not len(rows1) or not len(rows2):
+        empty = numpy.empty(0,dtype=numpy.intp)
+        return empty, empty
+    sorted_rows2 = rows2[numpy.argsort(store.aspects[rows2],kind='stable')]
+    keys2 = store.aspects[sorted_rows2]
+    keys1 = store.aspects[rows1]
+    lower = numpy.searchsorted(keys2,keys1,'left')
+    counts = numpy.searchsorted(keys2,keys1,'right')-lower
+    # Expand each row of rows1 to all rows of rows2 in the range [lower,lower+count) of sorted_rows2
+    offsets = numpy.arange(counts.sum())-numpy.repeat(numpy.cumsum(counts)-counts,counts)
+    return numpy.repeat(rows1,counts), sorted_rows2[numpy.repeat(lower,counts)+offsets]
+
+def _dqc_0004(store,rule_id,concept1,concept2):
+    """DQC_0004 Element Values Are Equal"""
+
+    rows1, rows2 = join(store,store.rows(concept1),store.rows(concept2))
+    decimals, values1, values2 = compare_decimals(store,rows1,rows2)
+    tolerance = numpy.where(numpy.isfinite(decimals),2*numpy.power(10.0,-numpy.where(numpy.isfinite(decimals),decimals,0)),0)
+    errors = ~(numpy.abs(values1-values2) <= tolerance)
+    return [Finding(rule_id,{'fact1': int(row1), 'fact2': int(row2)}) for row1, row2 in zip(rows1[errors],rows2[errors])]
+
+def dqc_0004(store,namespaces,suppress_errors):
+    """DQC_0004 Element Values Are Equal"""
+
+    if is_suppressed('DQC.US.0004.16',suppress_errors) or 'us-gaap' not in namespaces:
+        return []
+    return _dqc_0004(store,'DQC.US.0004.16',clark(namespaces['us-gaap'],'Assets'),clark(namespaces['us-gaap'],'LiabilitiesAndStockholdersEquity'))
+
+def dqc_0009(store,namespaces,suppress_errors):
+    """DQC_0009 Element A must be less than or equal to Element B"""
+
+    findings = []
+    for rule_id, prefix1, name1, prefix2, name2 in dqc_reference_data.load().dqc_0009_facts:
+        if is_suppressed(rule_id,suppress_errors) or prefix1 not in namespaces or prefix2 not in namespaces:
+            continue
+        rows1, rows2 = join(store,store.rows(clark(namespaces[prefix1],name1)),store.rows(clark(namespaces[prefix2],name2)))
+        decimals, values1, values2 = compare_decimals(store,rows1,rows2)
+        errors = ~(values1 <= values2)
+        findings.extend(Finding(rule_id,{'fact1': int(row1), 'fact2': int(row2)}) for row1, row2 in zip(rows1[errors],rows2[errors]))
+    return findings
+
+def dqc_0015(store,namespaces,suppress_errors):
+    """DQC_0015 Negative Values"""
+
+    reference_data = dqc_reference_data.load()
+    prefixes = {namespace: prefix for prefix, namespace in namespaces.items()}
+    codes = [None]
+    code_index = {}
+    concept_codes = numpy.zeros(len(store.concepts),dtype=numpy.int32)
+    for i, concept in enumerate(store.concepts):
+        namespace, local_name = split_clark(concept)
+        rule_id = reference_data.dqc_0015_concepts.get((prefixes.get(namespace),local_name))
+        if rule_id and not is_suppressed(rule_id,suppress_errors):
+            if rule_id not in code_index:
+                code_index[rule_id] = len(codes)
+                codes.append(rule_id)
+            concept_codes[i] = code_index[rule_id]
+
+    matcher = dqc_reference_data.member_exclusions_matcher(reference_data.dqc_0015_member_exclusions_compiled)
+    excluded = numpy.array([any(matcher(split_clark(dim)[1],split_clark(member)[1]) for dim, member in key) for key in store.dimension_keys],dtype=bool)
+
+    fact_codes = concept_codes[store.concept] if len(store.concepts) else numpy.zeros(0,dtype=numpy.int32)
+    errors = (fact_codes > 0) & ~store.nil & (store.value < 0) & ~excluded[store.dimensions]
+    return [Finding(codes[fact_codes[row]],{'fact1': int(row)}) for row in numpy.flatnonzero(errors)]
+
+def _document_period_end_dates(store,dei_namespace):
+    """Returns the rows of the DocumentPeriodEndDate facts and a boolean array which is True if the fact value is a valid date within 3 days of the end date of its context."""
+    rows = store.rows(clark(dei_namespace,'DocumentPeriodEndDate'))
+    values = numpy.array([_parse_date(text) for text in store.text[rows]],dtype='datetime64[D]')
+    ends = store.end[rows]
+    # Unparseable values and forever or invalid periods are NaT, which must not pass the day difference test
+    valid = ~numpy.isnat(values) & ~numpy.isnat(ends)
+    valid[valid] = numpy.abs((values[valid]-ends[valid]).astype(numpy.int64)) <= 3
+    return rows, valid
+
+dqc_0033_ignored_names = ('EntityCommonStockSharesOutstanding','EntityPublicFloat','DocumentPeriodEndDate','EntityNumberOfEmployees','EntityListingDepositoryReceiptRatio')
+
+def dqc_0033(store,namespaces,suppress_errors):
+    """DQC_0033 Document Period End Date Context"""
+
+    dei_namespace = namespaces['dei']
+    if is_suppressed('DQC.US.0033.2',suppress_errors):
+        return []
+    legal_entities, members = store.dimension_members(clark(dei_namespace,'LegalEntityAxis'))
+
+    # The last DocumentPeriodEndDate fact of each legal entity determines its reporting period. Facts without the legal entity dimension use index 0 of the default member.
+    dpe_rows, dpe_valid = _document_period_end_dates(store,dei_namespace)
+    reporting_period = numpy.full(len(members),-1,dtype=numpy.intp)
+    reporting_period_valid = numpy.zeros(len(members),dtype=bool)
+    for row, is_valid in zip(dpe_rows,dpe_valid):
+        reporting_period[legal_entities[row]] = row
+        reporting_period_valid[legal_entities[row]] = is_valid
+
+    rows = numpy.flatnonzero(store.concept_mask(lambda namespace, local_name: namespace == dei_namespace and local_name not in dqc_0033_ignored_names))
+    entities = legal_entities[rows]
+    entities = numpy.where(reporting_period[entities] >= 0,entities,0)
+    dpe = reporting_period[entities]
+    ends = store.end.view(numpy.int64)
+    errors = (dpe >= 0) & reporting_period_valid[entities] & (ends[rows] != ends[dpe])
+    return [Finding('DQC.US.0033.2',{'fact1': int(row), 'dei:DocumentPeriodEndDate': int(dpe_row)}) for row, dpe_row in zip(rows[errors],dpe[errors])]
+
+def dqc_0036(store,namespaces,suppress_errors):
+    """DQC_0036 Document Period End Date Context / Fact Value Check"""
+
+    if is_suppressed('DQC.US.0036.1',suppress_errors):
+        return []
+    rows, valid = _document_period_end_dates(store,namespaces['dei'])
+    return [Finding('DQC.US.0036.1',{'fact1': int(row)}) for row in rows[~valid]]
+
+# Registry of the DQC rules evaluated on the FactStore in the order in which their errors are reported
+Rule = collections.namedtuple('Rule',['id','check'])
+rules = [
+    Rule('DQC.US.0004',dqc_0004),
+    Rule('DQC.US.0009',dqc_0009),
+    Rule('DQC.US.0015',dqc_0015),
+    Rule('DQC.US.0033',dqc_0033),
+    Rule('DQC.US.0036',dqc_0036),
+]
+rule_checks = {rule.id: rule.check for rule in rules}
+
+def validate(store,suppress_errors=(),rule_ids=None,namespaces=None):
+    """Returns the list of findings of all rules (or the rules with the given ids) for the facts of the store."""
+    if namespaces is None:
+        namespaces = store.standard_namespaces()
+    if 'dei' not in namespaces:
+        return []
+    findings = []
+    for rule in rules:
+        if rule_ids is None or rule.id in rule_ids:
+            findings.extend(rule.check(store,namespaces,suppress_errors))
+    return findings
+
+def parse_args():
+    """Returns the command line arguments."""
+    parser = argparse.ArgumentParser(description='Evaluates the DQC rules 0004, 0009, 0015, 0033 and 0036 on fact dumps of SEC filings')
+    parser.add_argument('dumps', metavar='DUMP', nargs='+', help='JSON, CSV or Parquet fact dump')
+    parser.add_argument('--suppress', metavar='CODE', nargs='*', default=[], help='DQC.US.nnnn.mmm error codes or DQC.US.nnnn rule families to suppress')
+    parser.add_argument('--rules', metavar='RULE', nargs='*', help='DQC.US.nnnn rules to evaluate (default all)')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    suppress_errors = {code[:-2] if code.endswith('.*') else code for code in args.suppress}
+    rule_ids = set(args.rules) if args.rules else None
+    for path in args.dumps:
+        store = load(path)
+        for finding in validate(store,suppress_errors,rule_ids):
+            print('\t'.join([path,finding.code]+['%s: %s' % (name,store.describe(row)) for name, row in finding.facts.items()]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+# Copyright 2015 Altova GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+__copyright__ = "Copyright 2015 Altova GmbH"
+__license__ = 'http://www.apache.org/licenses/LICENSE-2.0'
+__version__ = '1.0'
+
+# This module implements the incremental mode of the DQC validation rules in dqc_validation.py which is enabled with the incrementalStore script parameter.
+# For each filing a JSON file is kept in the store directory which contains the hashes of all facts and, for each DQC rule, a fingerprint of the facts in its input buckets together with the errors reported by the rule.
+# Facts are identified across revisions by a key made of the concept, the aspects of the context (entity, period and dimensions) and the unit, so that changed context or unit ids do not matter.
+# When a revision of the filing is validated, a rule is only executed again if the fingerprint of its input facts has changed. Otherwise its cached errors are re-bound to the facts of the new revision.
+# All cached results are discarded if the DTS (the content of the filing's own documents and the stamps of all other documents), the DQC reference data, the scripts, the suppressed errors or the factStore parameter change.
+
+import hashlib,json,os,threading
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import altova_api.v2.xml as xml
+import altova_api.v2.xbrl as xbrl
+
+import cache_files
+
+def _qname_key(qname):
+    return '{%s}%s' % (qname.namespace_name,qname.local_name)
+
+class FactKeys(object):
+    """Computes the revision independent keys and value hashes of the facts of an instance. The context and unit parts of the keys are cached per context and unit id."""
+
+    def __init__(self,instance):
+        self.instance = instance
+        self.context_keys = {}
+        self.unit_keys = {}
+        self.index = None
+        self.lock = threading.Lock()
+
+    def context_key(self,fact):
+        """Returns a string with the entity, period and dimension aspects of the context of the given fact."""
+        key = self.context_keys.get(fact.contextRef)
+        if key is None:
+            identifier = fact.context.entity.identifier
+            period = fact.period_aspect_value
+            if period.period_type == xbrl.PeriodType.START_END:
+                period_key = '%s/%s' % (period.start.isoformat(),period.end.isoformat())
+            elif period.period_type == xbrl.PeriodType.INSTANT:
+                period_key = period.instant.isoformat()
+            else:
+                period_key = 'forever'
+            dimensions = []
+            for dim_aspect in fact.context.dimension_aspect_values:
+                value = dim_aspect.value
+                dimensions.append('%s=%s' % (_qname_key(dim_aspect.dimension.qname),_qname_key(value.qname) if isinstance(value,xbrl.taxonomy.Concept) else str(value)))
+            key = '|'.join([identifier.scheme,identifier.value,period_key]+sorted(dimensions))
+            self.context_keys[fact.contextRef] = key
+        return key
+
+    def unit_key(self,fact):
+        """Returns a string with the measures of the unit of the given fact or an empty string for non-numeric facts."""
+        unit = fact.unit
+        if unit is None:
+            return ''
+        key = self.unit_keys.get(fact.unitRef)
+        if key is None:
+            numerator = sorted(_qname_key(measure.value) for measure in unit.numerator_measures)
+            denominator = sorted(_qname_key(measure.value) for measure in unit.denominator_measures)
+            key = '*'.join(numerator)+'/'+'*'.join(denominator)
+            self.unit_keys[fact.unitRef] = key
+        return key
+
+    def key(self,fact):
+        """Returns the key of the fact made of the concept, context aspects and unit."""
+        if isinstance(fact,xbrl.Item):
+            return '%s#%s#%s' % (_qname_key(fact.qname),self.context_key(fact),self.unit_key(fact))
+        return _qname_key(fact.qname)
+
+    def value_hash(self,fact):
+        """Returns a hash of the value, the nil state and the decimals of the fact."""
+        if fact.xsi_nil:
+            value = 'nil'
+        elif isinstance(fact,xbrl.Item):
+            value = '%s|%s' % (fact.normalized_value,fact.decimals if fact.concept.is_numeric() else '')
+        else:
+            value = ''
+        return hashlib.sha1(value.encode()).hexdigest()[:16]
+
+    def fingerprint(self,facts):
+        """Returns a fingerprint of the keys and value hashes of the given facts which does not depend on their order."""
+        items = sorted('%s\t%s' % (self.key(fact),self.value_hash(fact)) for fact in facts)
+        return hashlib.sha1('\n'.join(items).encode()).hexdigest()
+
+    def fact_hashes(self):
+        """Returns a dict with the value hashes of all facts of the instance keyed by their fact key. Facts with the same key are combined into a single hash."""
+        hashes = {}
+        for fact in self.instance.facts:
+            key = self.key(fact)
+            value_hash = self.value_hash(fact)
+            hashes[key] = hashlib.sha1((hashes[key]+value_hash).encode()).hexdigest()[:16] if key in hashes else value_hash
+        return hashes
+
+    def find(self,key,value_hash):
+        """Returns the fact of the instance with the given key and value hash or None if there is no such fact."""
+        with self.lock:
+            if self.index is None:
+                self.index = {}
+                for fact in self.instance.facts:
+                    self.index.setdefault(self.key(fact),[]).append(fact)
+        for fact in self.index.get(key,()):
+            if self.value_hash(fact) == value_hash:
+                return fact
+        return None
+
+def document_stamp(dts,filing_uri):
+    """Returns a sorted list identifying the documents of the DTS. Local files in the directory of the filing (e.g. the company extension taxonomy) are identified by their file name and a hash of their content, all other documents by their uri and the modification time and size of local files."""
+    filing_dir = filing_uri.rsplit('/',1)[0]+'/'
+    stamp = []
+    for doc in dts.documents:
+        uri = doc.uri
+        if uri.startswith(filing_dir):
+            parts = urlparse(uri)
+            if parts.scheme == 'file':
+                try:
+                    with open(url2pathname(parts.path),'rb') as f:
+                        stamp.append('%s|%s' % (uri.rsplit('/',1)[-1],hashlib.sha1(f.read()).hexdigest()))
+                    continue
+                except OSError:
+                    pass
+        stamp.append('%s|%r' % (uri,cache_files.uri_stamp(uri)))
+    return sorted(stamp)
+
+class IncrementalStore(object):
+    """Per-filing store of fact hashes and DQC rule results persisted as a JSON file in a local directory."""
+
+    def __init__(self,directory,filing_key,global_fingerprint):
+        self.path = os.path.join(directory,hashlib.sha1(filing_key.encode()).hexdigest()+'.json')
+        self.global_fingerprint = global_fingerprint
+        self.rules = {}
+        self.facts = {}
+        self.lock = threading.Lock()
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get('version') == __version__ and data.get('global') == global_fingerprint:
+                self.rules = data['rules']
+                self.facts = data['facts']
+        except (OSError,ValueError,KeyError):
+            pass
+
+    def fingerprint(self,rule_id):
+        """Returns the stored input fingerprint of the rule or None."""
+        cached = self.rules.get(rule_id)
+        return cached['inputs'] if cached else None
+
+    def changed_facts(self,fact_hashes):
+        """Returns the set of fact keys which have been added, removed or changed since the stored revision."""
+        changed = {key for key, value_hash in fact_hashes.items() if self.facts.get(key) != value_hash}
+        changed.update(key for key in self.facts if key not in fact_hashes)
+        return changed
+
+    def lookup(self,rule_id,fingerprint,keys):
+        """Returns the cached errors of the rule as list of (rule_id, kargs) tuples re-bound to the facts of the current instance or None if the rule needs to be executed."""
+        cached = self.rules.get(rule_id)
+        if cached is None or cached['inputs'] != fingerprint or cached['errors'] is None:
+            return None
+        entries = []
+        for error_id, params in cached['errors']:
+            kargs = {}
+            for name, value in params.items():
+                if 'fact' in value:
+                    fact = keys.find(value['fact'],value['hash'])
+                    if fact is None:
+                        return None
+                    kargs[name] = fact
+                elif 'concept' in value:
+                    concept = keys.instance.dts.resolve_concept(xml.QName(value['concept'][1],value['concept'][0]))
+                    if concept is None:
+                        return None
+                    kargs[name] = concept
+                else:
+                    kargs[name] = value['str']
+            entries.append((error_id,kargs))
+        return entries
+
+    def update(self,rule_id,fingerprint,entries,keys):
+        """Stores the errors reported by the rule for the given input fingerprint. If an error argument cannot be serialized, only the fingerprint is stored and the rule will be executed again next time."""
+        errors = []
+        for error_id, kargs in entries:
+            params = {}
+            for name, value in kargs.items():
+                if isinstance(value,xbrl.Fact):
+                    params[name] = {'fact': keys.key(value), 'hash': keys.value_hash(value)}
+                elif isinstance(value,xbrl.taxonomy.Concept):
+                    params[name] = {'concept': [value.qname.namespace_name,value.qname.local_name]}
+                elif isinstance(value,str):
+                    params[name] = {'str': value}
+                else:
+                    errors = None
+                    break
+            if errors is None:
+                break
+            errors.append((error_id,params))
+        with self.lock:
+            self.rules[rule_id] = {'inputs': fingerprint, 'errors': errors}
+
+    def save(self,fact_hashes):
+        """Writes the store with the given fact hashes of the current revision."""
+        data = {'version': __version__, 'global': self.global_fingerprint, 'facts': fact_hashes, 'rules': self.rules}
+        try:
+            os.makedirs(os.path.dirname(self.path),exist_ok=True)
+        except OSError:
+            return
+        cache_files.write_atomic(self.path,lambda f: json.dump(data,f))
@@ -0,0 +1,187 @@
+# Copyright 2015 Altova GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+__copyright__ = "Copyright 2015 Altova GmbH"
+__license__ = 'http://www.apache.org/licenses/LICENSE-2.0'
+__version__ = '1.0'
+
+# This module loads the reference data of the DQC validation rules implemented in dqc_validation.py from the dqc_*.json files.
+# The data together with all derived indexes is loaded lazily on first use and stored in the precompiled cache file dqc_reference_data.cache next to this module.
+# The cache is invalidated whenever one of the JSON source files or the version of this module changes. If the cache file cannot be written (e.g. because the script directory is read-only) the JSON files are parsed on each first use.
+
+import collections,json,os,pickle,re,threading
+
+import cache_files
+
+ReferenceData = collections.namedtuple('ReferenceData',['msg_templates','dqc_0006_period_focus_durations','dqc_0009_facts','dqc_0015_facts','dqc_0015_concepts','dqc_0015_prefixes','dqc_0015_member_exclusions','dqc_0015_member_exclusions_compiled'])
+
+# Compiled form of the DQC_0015 member exclusion rules which can be pickled. Compound AND/OR tests are stored as nested (test, arg1, arg2) tuples and simple tests as ('Contains the text', dim, pattern) or ('Equals', dim, name) tuples.
+MemberExclusions = collections.namedtuple('MemberExclusions',['member_names','axis_names','re_member','re_axis','tests'])
+
+source_files = {
+    'msg_templates': 'dqc_msg_templates.json',
+    'dqc_0006_period_focus_durations': 'dqc_0006_period_focus_durations.json',
+    'dqc_0009_facts': 'dqc_0009_facts.json',
+    'dqc_0015_facts': 'dqc_0015_facts.json',
+    'dqc_0015_member_exclusions': 'dqc_0015_member_exclusions.json',
+}
+cache_file = 'dqc_reference_data.cache'
+
+# Patterns of the namespaces of the standard taxonomies keyed by their usual prefix
+re_namespaces = {
+    'country':  re.compile(r'http://xbrl\.(us|sec\.gov)/country/[0-9-]{10}'),
+    'currency': re.compile(r'http://xbrl\.(us|sec\.gov)/currency/[0-9-]{10}'),
+    'dei':      re.compile(r'http://xbrl\.(us|sec\.gov)/dei/[0-9-]{10}'),
+    'exch':     re.compile(r'http://xbrl\.(us|sec\.gov)/exch/[0-9-]{10}'),
+    'invest':   re.compile(r'http://xbrl\.(us|sec\.gov)/invest/[0-9-]{10}'),
+    'naics':    re.compile(r'http://xbrl\.(us|sec\.gov)/naics/[0-9-]{10}'),
+    'sic':      re.compile(r'http://xbrl\.(us|sec\.gov)/sic/[0-9-]{10}'),
+    'stpr':     re.compile(r'http://xbrl\.(us|sec\.gov)/stpr/[0-9-]{10}'),
+    'us-gaap':  re.compile(r'http://(xbrl\.us|fasb\.org)/us-gaap/[0-9-]{10}'),
+}
+
+def standard_namespaces(target_namespaces):
+    """Returns a dict of prefix and namespace key/value pairs for the standard namespaces among the given target namespaces."""
+    namespaces = {}
+    for namespace in target_namespaces:
+        for prefix, pattern in re_namespaces.items():
+            if pattern.fullmatch(namespace):
+                namespaces[prefix] = namespace
+    return namespaces
+
+_lock = threading.Lock()
+_reference_data = None
+
+def _compile_member_exclusions_test(rule):
+    """Compiles a single member exclusion test into a nested tuple."""
+    if rule['test'] == 'Contains the text':
+        return (rule['test'],rule['dim'],re.compile(rule['text'],re.IGNORECASE))
+    elif rule['test'] == 'Equals':
+        return (rule['test'],rule['dim'],rule['name'])
+    elif rule['test'] in ('AND','OR'):
+        return (rule['test'],_compile_member_exclusions_test(rule['arg1']),_compile_member_exclusions_test(rule['arg2']))
+    raise RuntimeError('Unknown member exclusion test '+rule['test'])
+
+def compile_member_exclusions(rules):
+    """Compiles the DQC_0015 member exclusion rules into a MemberExclusions tuple. All top-level 'Contains the text' tests are combined into one case-insensitive regex and all top-level 'Equals' tests into one set of names for each Member/Axis side."""
+    texts = {'Member': [], 'Axis': []}
+    names = {'Member': set(), 'Axis': set()}
+    tests = []
+    for rule in rules:
+        if rule['test'] == 'Contains the text':
+            texts[rule['dim']].append('(?:%s)' % rule['text'])
+        elif rule['test'] == 'Equals':
+            names[rule['dim']].add(rule['name'])
+        else:
+            tests.append(_compile_member_exclusions_test(rule))
+
+    return MemberExclusions(
+        frozenset(names['Member']),
+        frozenset(names['Axis']),
+        re.compile('|'.join(texts['Member']),re.IGNORECASE) if texts['Member'] else None,
+        re.compile('|'.join(texts['Axis']),re.IGNORECASE) if texts['Axis'] else None,
+        tuple(tests))
+
+def _member_exclusions_test_function(test):
+    """Returns a function taking the local names of the dimension and the domain member which evaluates the compiled test."""
+    if test[0] == 'Contains the text':
+        pattern = test[2]
+        if test[1] == 'Member':
+            return lambda dimension, member: pattern.search(member) is not None
+        return lambda dimension, member: pattern.search(dimension) is not None
+    elif test[0] == 'Equals':
+        name = test[2]
+        if test[1] == 'Member':
+            return lambda dimension, member: member == name
+        return lambda dimension, member: dimension == name
+    arg1 = _member_exclusions_test_function(test[1])
+    arg2 = _member_exclusions_test_function(test[2])
+    if test[0] == 'AND':
+        return lambda dimension, member: arg1(dimension,member) and arg2(dimension,member)
+    return lambda dimension, member: arg1(dimension,member) or arg2(dimension,member)
+
+def member_exclusions_matcher(exclusions):
+    """Returns a function which returns True if the given dimension and domain member local names are excluded by the compiled MemberExclusions."""
+    member_names = exclusions.member_names
+    axis_names = exclusions.axis_names
+    re_member = exclusions.re_member
+    re_axis = exclusions.re_axis
+    tests = [_member_exclusions_test_function(test) for test in exclusions.tests]
+
+    def is_excluded(dimension,member):
+        if member in member_names or dimension in axis_names:
+            return True
+        if re_member and re_member.search(member):
+            return True
+        if re_axis and re_axis.search(dimension):
+            return True
+        return any(test(dimension,member) for test in tests)
+    return is_excluded
+
+def _source_stamp(dirname):
+    """Returns a tuple identifying the version of this module and the state of all JSON source files."""
+    stamp = [__version__]
+    for name in sorted(source_files.values()):
+        stamp.append((name,cache_files.file_stamp(os.path.join(dirname,name))))
+    return tuple(stamp)
+
+def _parse(dirname):
+    """Parses the JSON source files and builds all derived indexes."""
+    data = {}
+    for field, name in source_files.items():
+        with open(os.path.join(dirname,name)) as f:
+            data[field] = json.load(f)
+
+    # Index of the concepts checked by DQC_0015 keyed by (prefix,local name), so that the rule only needs to look up the concepts of the facts actually reported in the instance.
+    data['dqc_0015_concepts'] = {(prefix,name): rule_id for rule_id, prefix, name in data['dqc_0015_facts']}
+    data['dqc_0015_prefixes'] = sorted({prefix for prefix, name in data['dqc_0015_concepts']})
+    data['dqc_0015_member_exclusions_compiled'] = compile_member_exclusions(data['dqc_0015_member_exclusions'])
+    return ReferenceData(**data)
+
+def _read_cache(path,stamp):
+    """Returns the cached ReferenceData or None if the cache file is missing, outdated or unreadable."""
+    try:
+        with open(path,'rb') as f:
+            cached_stamp, data = pickle.load(f)
+    except Exception:
+        return None
+    return data if cached_stamp == stamp else None
+
+def _write_cache(path,stamp,data):
+    """Writes the ReferenceData to the cache file."""
+    cache_files.write_atomic(path,lambda f: pickle.dump((stamp,data),f,pickle.HIGHEST_PROTOCOL),'wb')
+
+def stamp(dirname=None):
+    """Returns a tuple identifying the version of this module and the state of the JSON source files in dirname (defaults to the directory of this module)."""
+    return _source_stamp(dirname or os.path.dirname(os.path.abspath(__file__)))
+
+def load(dirname=None):
+    """Returns the ReferenceData from the precompiled cache or from the JSON source files in dirname (defaults to the directory of this module). The data is loaded only once per process."""
+    global _reference_data
+    if _reference_data is not None and dirname is None:
+        return _reference_data
+
+    with _lock:
+        if _reference_data is not None and dirname is None:
+            return _reference_data
+
+        path = dirname or os.path.dirname(os.path.abspath(__file__))
+        stamp = _source_stamp(path)
+        data = _read_cache(os.path.join(path,cache_file),stamp)
+        if data is None:
+            data = _parse(path)
+            _write_cache(os.path.join(path,cache_file),stamp,data)
+
+        if dirname is None:
+            _reference_data = data
+        return data
@@ -34,7 +34,7 @@ import altova_api.v2.xsd as xsd
 import altova_api.v2.xbrl as xbrl
 import dqc_validation
 
-import argparse,collections,concurrent.futures,datetime,logging,multiprocessing,re,tempfile,time,urllib.parse,urllib.request,zipfile
+import argparse,collections,concurrent.futures,datetime,itertools,logging,multiprocessing,re,tempfile,time,urllib.parse,urllib.request,zipfile
 
 re_error_code = re.compile(r'\[(DQC\.US\.\d+\.\d+)\] ')
 
@@ -222,9 +222,12 @@ def execute_variation(testcase,variation):
 
     logging.info('[%s] Validating instance %s',variation['id'],uri)
     instance, error_log = xbrl.Instance.create_from_url(uri,error_limit=200)
-    dqc_validation.validate(instance,error_log,{'suppressErrors': variation['results']['blockedMessageCodes']})
-    if error_log.has_errors() and logging.getLogger().isEnabledFor(logging.DEBUG):
-        logging.debug('[%s] Error log:\n%s',variation['id'],'\n'.join(error.text for error in error_log))
+    # Only the error codes are needed to check the results, so the DQC messages are not rendered unless debug logging is enabled
+    dqc_error_log = dqc_validation.DeferredErrorLog()
+    dqc_validation.validate(instance,dqc_error_log,{'suppressErrors': variation['results']['blockedMessageCodes']})
+    has_errors = error_log.has_errors() or len(dqc_error_log) > 0
+    if has_errors and logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug('[%s] Error log:\n%s',variation['id'],'\n'.join(error.text for error in itertools.chain(error_log,dqc_error_log)))
 
     error_counts = collections.Counter()
     for error in error_log:
@@ -234,8 +237,9 @@ def execute_variation(testcase,variation):
                 error_counts[m.group(1)] += 1
             else:
                 error_counts['other'] += 1
+    error_counts.update(dqc_error_log.rule_ids())
 
-    passed = False if len(variation['results']['errors']) == 0 and error_log.has_errors() else True
+    passed = False if len(variation['results']['errors']) == 0 and has_errors else True
     for code, error in variation['results']['errors'].items():
         if error['count'] != error_counts[code]:
             passed = False
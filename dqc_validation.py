@@ -20,7 +20,15 @@ __version__ = '1.0'
 #
 # The following script parameters can be additionally specified:
 #
-#   suppressErrors                  A list of DQC.US.nnnn.mmm error codes separated by | characters.
+#   suppressErrors                  A list of DQC.US.nnnn.mmm error codes or DQC.US.nnnn rule families (optionally followed by .*) separated by | characters.
+#   enableRules                     A list of DQC.US.nnnn rules separated by | characters. Only these rules will be executed.
+#   disableRules                    A list of DQC.US.nnnn rules separated by | characters. These rules will not be executed.
+#   maxWorkers                      The number of threads used to execute the DQC rules concurrently (default 1).
+#   profile                         Set to true to record wall time, facts examined, errors emitted and peak allocations of each DQC rule.
+#   profileFile                     The name of the JSON file in the output directory to which the profile is written (default dqc_profile.json).
+#   incrementalStore                A local directory in which the fact hashes and results of each filing are stored. Only rules whose input facts changed since the last validation of the filing are executed again.
+#   incrementalKey                  The key which identifies the filing in the incremental store (defaults to the file name of the instance).
+#   factStore                       Set to true to evaluate the rules DQC.US.0004, 0009, 0015, 0033 and 0036 with NumPy on a columnar copy of the facts (requires the 3rd party module numpy, see dqc_factstore.py).
 #
 # Example invocations
 #
@@ -33,7 +41,7 @@ __version__ = '1.0'
 #
 # Using Altova RaptorXML+XBRL Server with XMLSpy client:
 #
-# 1a.   Copy efm_validation.py and all dqc_* files to the Altova RaptorXML Server script directory /etc/scripts/sec-edgar-tools/ (default C:\Program Files\Altova\RaptorXMLXBRLServer2016\etc\scripts\sec-edgar-tools\) or
+# 1a.   Copy efm_validation.py, cache_files.py, label_cache.py, network_graph.py, validation_profiler.py, xbrl_decimals.py and all dqc_* files to the Altova RaptorXML Server script directory /etc/scripts/sec-edgar-tools/ (default C:\Program Files\Altova\RaptorXMLXBRLServer2016\etc\scripts\sec-edgar-tools\) or
 # 1b.   Edit the <server.script-root-dir> tag in /etc/server_config.xml
 # 2.    Start Altova RaptorXML+XBRL server.
 # 3.    Start Altova XMLSpy, open Tools|Manage Raptor Servers... and connect to the running server
@@ -44,24 +52,21 @@ __version__ = '1.0'
 # 8.    Validate instance file with XML|Validate XML on Server (Ctrl+F8)
 
 
-import collections,datetime,decimal,json,operator,os,re,sys
+import collections,concurrent.futures,datetime,hashlib,operator,os,sys,threading
 import altova_api.v2.xml as xml
 import altova_api.v2.xsd as xsd
 import altova_api.v2.xbrl as xbrl
 
+sys.path.append(os.path.dirname(__file__))
+import dqc_incremental
+import dqc_reference_data
+import label_cache
+import validation_profiler
+import xbrl_decimals
+
 RuleInfo = collections.namedtuple('ruleInfo',['ruleVersion','releaseDate','uri'])
 
-re_namespaces = {
-    'country':  re.compile(r'http://xbrl\.(us|sec\.gov)/country/[0-9-]{10}'),
-    'currency': re.compile(r'http://xbrl\.(us|sec\.gov)/currency/[0-9-]{10}'),
-    'dei':      re.compile(r'http://xbrl\.(us|sec\.gov)/dei/[0-9-]{10}'),
-    'exch':     re.compile(r'http://xbrl\.(us|sec\.gov)/exch/[0-9-]{10}'),
-    'invest':   re.compile(r'http://xbrl\.(us|sec\.gov)/invest/[0-9-]{10}'),
-    'naics':    re.compile(r'http://xbrl\.(us|sec\.gov)/naics/[0-9-]{10}'),
-    'sic':      re.compile(r'http://xbrl\.(us|sec\.gov)/sic/[0-9-]{10}'),
-    'stpr':     re.compile(r'http://xbrl\.(us|sec\.gov)/stpr/[0-9-]{10}'),
-    'us-gaap':  re.compile(r'http://(xbrl\.us|fasb\.org)/us-gaap/[0-9-]{10}'),
-}
+re_namespaces = dqc_reference_data.re_namespaces
 
 msg_template_properties = [
     'The properties of this ${fact1.name} fact are:',
@@ -70,13 +75,6 @@ msg_template_properties = [
     'Unit: ${fact1.unit}',
     'Rule version: ${ruleVersion}',
 ]
-msg_templates = json.load(open(os.path.join(os.path.dirname(__file__),'dqc_msg_templates.json')))
-
-dqc_0006_period_focus_durations = json.load(open(os.path.join(os.path.dirname(__file__),'dqc_0006_period_focus_durations.json')))
-dqc_0009_facts = json.load(open(os.path.join(os.path.dirname(__file__),'dqc_0009_facts.json')))
-dqc_0015_facts = json.load(open(os.path.join(os.path.dirname(__file__),'dqc_0015_facts.json')))
-dqc_0015_member_exclusions = json.load(open(os.path.join(os.path.dirname(__file__),'dqc_0015_member_exclusions.json')))
-
 def prefixed_name(x):
     """Give a fact of concept returns the name formatted as [prefix:]name."""
     qname = x.qname
@@ -88,28 +86,47 @@ def label(x):
         concept = x
     else:
         concept = x.concept
-    labels = list(concept.labels(lang='en',label_role=xbrl.taxonomy.ROLE_LABEL))
-    return labels[0].text if labels else prefixed_name(x)
+    text = label_cache.label(concept,xbrl.taxonomy.ROLE_LABEL,'en')
+    return text if text is not None else prefixed_name(x)
+
+PeriodInfo = collections.namedtuple('PeriodInfo',['period_type','start','end','duration','period','start_text','end_text'])
+
+def period_info(fact):
+    """Returns a PeriodInfo tuple with the start and end (or instant) dates, the duration in days, the period element and the formatted dates of the context of the given fact."""
+    aspect_value = fact.period_aspect_value
+    period = fact.context.period
+    if aspect_value.period_type == xbrl.PeriodType.START_END:
+        return PeriodInfo(aspect_value.period_type,aspect_value.start,aspect_value.end,(aspect_value.end-aspect_value.start).days,period,format_date(period.start_date.value),format_date(period.end_date.value,is_end=True))
+    elif aspect_value.period_type == xbrl.PeriodType.INSTANT:
+        return PeriodInfo(aspect_value.period_type,None,aspect_value.instant,0,period,None,format_date(period.instant.value,is_end=True))
+    else:
+        return PeriodInfo(aspect_value.period_type,None,datetime.datetime.max,sys.maxsize,period,None,None)
+
+class PeriodCache(object):
+    """Caches the PeriodInfo of each context of an instance keyed by the context id, as all facts sharing a context have the same period."""
+
+    def __init__(self):
+        self.periods = {}
 
-def period_end(fact):
+    def get(self,fact):
+        """Returns the PeriodInfo of the context of the given fact."""
+        info = self.periods.get(fact.contextRef)
+        if info is None:
+            info = period_info(fact)
+            self.periods[fact.contextRef] = info
+        return info
+
+def period_end(fact,periods=None):
     """Given a fact returns either the end date of the duration period or instant date of the instant period."""
-    period = fact.period_aspect_value
-    if period.period_type == xbrl.PeriodType.START_END:
-        return period.end
-    elif period.period_type == xbrl.PeriodType.INSTANT:
-        return period.instant
-    else:
-        return datetime.datetime.max
+    if periods is not None:
+        return periods.get(fact).end
+    return period_info(fact).end
 
-def period_duration(fact):
+def period_duration(fact,periods=None):
     """Given a fact returns the duration of the period in days."""
-    period = fact.period_aspect_value
-    if period.period_type == xbrl.PeriodType.START_END:
-        return (period.end-period.start).days
-    elif period.period_type == xbrl.PeriodType.INSTANT:
-        return 0
-    else:
-        return sys.maxsize
+    if periods is not None:
+        return periods.get(fact).duration
+    return period_info(fact).duration
 
 def format_date(val,is_end=False):
     """Given a date or datetime object, return the date part as a string. If the is_end flag is set, the date represents the end of the day which is according to XBRL 2.1 midnight of the next day. In this case, a day is subtracted first before formatting."""
@@ -119,191 +136,291 @@ def format_date(val,is_end=False):
         val -= datetime.timedelta(days=1)
     return val.strftime('%Y-%m-%d')
 
-def create_error(msg,location,severity,children,**kargs):
-    """Creates a xbrl.Error object from a message template msg and other arguments depending on the template."""
-    msg_parts = []
-    msg_params = {}
-
-    text_start = 0
-    while True:
-        param_start = msg.find('${',text_start)
-        if param_start == -1:
-            msg_parts.append(msg[text_start:])
-            break
-        if text_start < param_start:
-            msg_parts.append(msg[text_start:param_start])
-
-        param_start += 2
-        param_end = msg.find('}',param_start)
-        param = msg[param_start:param_end]
+def _render_fact_name(key,fact,msg_parts,msg_params,periods):
+    msg_parts.append('{%s}'%key)
+    msg_params[key] = xbrl.Error.Param(prefixed_name(fact),tooltip=str(fact.qname),location=fact,quotes=False)
+
+def _render_fact_local_name(key,fact,msg_parts,msg_params,periods):
+    msg_parts.append('{%s}'%key)
+    msg_params[key] = xbrl.Error.Param(fact.local_name,tooltip=str(fact.qname),location=fact,quotes=False)
+
+def _render_fact_label(key,fact,msg_parts,msg_params,periods):
+    msg_parts.append('{%s}'%key)
+    msg_params[key] = xbrl.Error.Param(label(fact),tooltip=str(fact.qname),location=fact,deflocation=fact.concept,quotes=False)
+
+def _render_fact_value(key,fact,msg_parts,msg_params,periods):
+    msg_parts.append('{%s:value}'%key)
+    if fact.xsi_nil:
+        msg_params[key] = xbrl.Error.Param('nil',location=fact.element.find_attribute(('nil',xsd.NAMESPACE_XSI)),quotes=False)
+    elif fact.concept.is_numeric():
+        msg_params[key] = xbrl.Error.Param('{:,}'.format(fact.numeric_value),location=fact,quotes=False)
+    else:
+        msg_params[key] = xbrl.Error.Param(fact.normalized_value,location=fact,quotes=False)
+
+def _render_fact_period(key,fact,msg_parts,msg_params,periods):
+    info = periods.get(fact)
+    period = info.period
+    if info.period_type == xbrl.PeriodType.INSTANT:
+        msg_parts.append('{%s.instant:value}'%key)
+        msg_params[key+'.instant'] = xbrl.Error.Param(info.end_text,location=period.instant,quotes=False)
+    elif info.period_type == xbrl.PeriodType.START_END:
+        msg_parts.append('{%s.startDate:value} - {%s.endDate:value}'%(key,key))
+        msg_params[key+'.startDate'] = xbrl.Error.Param(info.start_text,location=period.start_date,quotes=False)
+        msg_params[key+'.endDate'] = xbrl.Error.Param(info.end_text,location=period.end_date,quotes=False)
+    else:
+        msg_parts.append('forever')
+
+def _render_fact_period_start_date(key,fact,msg_parts,msg_params,periods):
+    info = periods.get(fact)
+    msg_parts.append('{%s:value}'%key)
+    msg_params[key] = xbrl.Error.Param(info.start_text,location=info.period.start_date,quotes=False)
+
+def _render_fact_period_end_date(key,fact,msg_parts,msg_params,periods):
+    info = periods.get(fact)
+    end_date = info.period.instant if info.period_type == xbrl.PeriodType.INSTANT else info.period.end_date
+    msg_parts.append('{%s:value}'%key)
+    msg_params[key] = xbrl.Error.Param(info.end_text,location=end_date,quotes=False)
+
+def _render_fact_period_instant(key,fact,msg_parts,msg_params,periods):
+    info = periods.get(fact)
+    msg_parts.append('{%s:value}'%key)
+    msg_params[key] = xbrl.Error.Param(info.end_text,location=info.period.instant,quotes=False)
+
+def _render_fact_period_duration_days(key,fact,msg_parts,msg_params,periods):
+    msg_parts.append('{%s}'%key)
+    msg_params[key] = xbrl.Error.Param(str(period_duration(fact,periods)),quotes=False)
+
+def _render_fact_dimensions(key,fact,msg_parts,msg_params,periods):
+    dimension_aspects = list(fact.context.dimension_aspect_values)
+    if dimension_aspects:
+        msg_parts.append(', '.join('{%s.dim%d} = {%s.member%d}'%(key,i,key,i) for i, aspect in enumerate(dimension_aspects)))
+        for i, aspect in enumerate(dimension_aspects):
+            msg_params['%s.dim%d'%(key,i)] = xbrl.Error.Param(prefixed_name(aspect.dimension),tooltip=str(aspect.dimension.qname),deflocation=aspect.dimension,quotes=False)
+            msg_params['%s.member%d'%(key,i)] = xbrl.Error.Param(prefixed_name(aspect.value),tooltip=str(aspect.value.qname),deflocation=aspect.value,quotes=False)
+    else:
+        msg_parts.append('none')
+
+def _render_fact_unit(key,fact,msg_parts,msg_params,periods):
+    if fact.unit:
+        numerator = list(fact.unit.numerator_measures)
+        denominator = list(fact.unit.denominator_measures)
+        msg_parts.append(' '.join('{%s.num%d:value}'%(key,i) for i, measure in enumerate(numerator)))
+        for i, measure in enumerate(numerator):
+            msg_params['%s.num%d'%(key,i)] = xbrl.Error.Param(measure.value.local_name,tooltip=str(measure.value),location=measure,quotes=False)
+        if len(denominator):
+            msg_parts.append(' / ')
+            msg_parts.append(' '.join('{%s.denom%d:value}'%(key,i) for i, measure in enumerate(denominator)))
+            for i, measure in enumerate(denominator):
+                msg_params['%s.denom%d'%(key,i)] = xbrl.Error.Param(measure.value.local_name,tooltip=str(measure.value),location=measure,quotes=False)
+    else:
+        msg_parts.append('none')
+
+def _render_fact_decimals(key,fact,msg_parts,msg_params,periods):
+    msg_parts.append('{%s}'%key)
+    msg_params[key] = xbrl.Error.Param(str(fact.decimals),location=fact.element.find_attribute('decimals'),quotes=False)
+
+def _render_concept_name(key,concept,msg_parts,msg_params):
+    msg_parts.append('{%s}'%key)
+    msg_params[key] = xbrl.Error.Param(prefixed_name(concept),tooltip=str(concept.qname),deflocation=concept,quotes=False)
+
+def _render_concept_local_name(key,concept,msg_parts,msg_params):
+    msg_parts.append('{%s}'%key)
+    msg_params[key] = xbrl.Error.Param(concept.name,tooltip=str(concept.qname),deflocation=concept,quotes=False)
+
+def _render_concept_label(key,concept,msg_parts,msg_params):
+    msg_parts.append('{%s}'%key)
+    msg_params[key] = xbrl.Error.Param(label(concept),tooltip=str(concept.qname),deflocation=concept,quotes=False)
+
+fact_renderers = {
+    'name': _render_fact_name,
+    'localName': _render_fact_local_name,
+    'label': _render_fact_label,
+    'value': _render_fact_value,
+    'period': _render_fact_period,
+    'period.startDate': _render_fact_period_start_date,
+    'period.endDate': _render_fact_period_end_date,
+    'period.instant': _render_fact_period_instant,
+    'period.durationDays': _render_fact_period_duration_days,
+    'dimensions': _render_fact_dimensions,
+    'unit': _render_fact_unit,
+    'decimals': _render_fact_decimals,
+}
+concept_renderers = {
+    'name': _render_concept_name,
+    'localName': _render_concept_local_name,
+    'label': _render_concept_label,
+}
+
+class MessageParam(object):
+    """A ${...} placeholder of a message template with the property accessors for facts and concepts bound at compile time."""
+    __slots__ = ('name','key','fact_renderer','fact_error','concept_renderer')
+
+    def __init__(self,param):
         param_parts = param.split('.')
-        param = param.replace(':','_')
-
-        if param_parts[0] not in kargs:
-            raise KeyError('Missing value for parameter '+param_parts[0])
-
-        if isinstance(kargs[param_parts[0]],xbrl.Fact):
-            fact = kargs[param_parts[0]]
-
-            if param_parts[1] == 'fact':
-                del param_parts[1]
-            if param_parts[1] == 'name':
-                msg_parts.append('{%s}'%param)
-                msg_params[param] = xbrl.Error.Param(prefixed_name(fact),tooltip=str(fact.qname),location=fact,quotes=False)
-            elif param_parts[1] == 'localName':
-                msg_parts.append('{%s}'%param)
-                msg_params[param] = xbrl.Error.Param(fact.local_name,tooltip=str(fact.qname),location=fact,quotes=False)
-            elif param_parts[1] == 'label':
-                msg_parts.append('{%s}'%param)
-                msg_params[param] = xbrl.Error.Param(label(fact),tooltip=str(fact.qname),location=fact,deflocation=fact.concept,quotes=False)
-            elif param_parts[1] == 'value':
-                msg_parts.append('{%s:value}'%param)
-                if fact.xsi_nil:
-                    msg_params[param] = xbrl.Error.Param('nil',location=fact.element.find_attribute(('nil',xsd.NAMESPACE_XSI)),quotes=False)
-                elif fact.concept.is_numeric():
-                    msg_params[param] = xbrl.Error.Param('{:,}'.format(fact.numeric_value),location=fact,quotes=False)
-                else:
-                    msg_params[param] = xbrl.Error.Param(fact.normalized_value,location=fact,quotes=False)
-            elif param_parts[1] == 'period':
-                period = fact.context.period
-                if len(param_parts) > 2:
-                    if param_parts[2] == 'startDate':
-                        msg_parts.append('{%s:value}'%param)
-                        msg_params[param] = xbrl.Error.Param(format_date(period.start_date.value),location=period.start_date,quotes=False)
-                    elif param_parts[2] == 'endDate':
-                        end_date = period.instant if period.type == xbrl.PeriodType.INSTANT else period.end_date
-                        msg_parts.append('{%s:value}'%param)
-                        msg_params[param] = xbrl.Error.Param(format_date(end_date.value,is_end=True),location=end_date,quotes=False)
-                    elif param_parts[2] == 'instant':
-                        msg_parts.append('{%s:value}'%param)
-                        msg_params[param] = xbrl.Error.Param(format_date(period.instant.value,is_end=True),location=period.instant,quotes=False)
-                    elif param_parts[2] == 'durationDays':
-                        msg_parts.append('{%s}'%param)
-                        msg_params[param] = xbrl.Error.Param(str(period_duration(fact)),quotes=False)
-                    else:
-                        raise KeyError('Unknown period property '+param_parts[2])
-                else:
-                    if period.type == xbrl.PeriodType.INSTANT:
-                        msg_parts.append('{%s.instant:value}'%param)
-                        msg_params[param+'.instant'] = xbrl.Error.Param(format_date(period.instant.value,is_end=True),location=period.instant,quotes=False)
-                    elif period.type == xbrl.PeriodType.START_END:
-                        msg_parts.append('{%s.startDate:value} - {%s.endDate:value}'%(param,param))
-                        msg_params[param+'.startDate'] = xbrl.Error.Param(format_date(period.start_date.value),location=period.start_date,quotes=False)
-                        msg_params[param+'.endDate'] = xbrl.Error.Param(format_date(period.end_date.value,is_end=True),location=period.end_date,quotes=False)
-                    else:
-                        msg_parts.append('forever')
-            elif param_parts[1] == 'dimensions':
-                dimension_aspects = list(fact.context.dimension_aspect_values)
-                if dimension_aspects:
-                    msg_parts.append(', '.join('{%s.dim%d} = {%s.member%d}'%(param,i,param,i) for i, aspect in enumerate(dimension_aspects)))
-                    for i, aspect in enumerate(dimension_aspects):
-                        msg_params['%s.dim%d'%(param,i)] = xbrl.Error.Param(prefixed_name(aspect.dimension),tooltip=str(aspect.dimension.qname),deflocation=aspect.dimension,quotes=False)
-                        msg_params['%s.member%d'%(param,i)] = xbrl.Error.Param(prefixed_name(aspect.value),tooltip=str(aspect.value.qname),deflocation=aspect.value,quotes=False)
-                else:
-                    msg_parts.append('none')
-            elif param_parts[1] == 'unit':
-                if fact.unit:
-                    numerator = list(fact.unit.numerator_measures)
-                    denominator = list(fact.unit.denominator_measures)
-                    msg_parts.append(' '.join('{%s.num%d:value}'%(param,i) for i, measure in enumerate(numerator)))
-                    for i, measure in enumerate(numerator):
-                        msg_params['%s.num%d'%(param,i)] = xbrl.Error.Param(measure.value.local_name,tooltip=str(measure.value),location=measure,quotes=False)
-                    if len(denominator):
-                        msg_parts.append(' / ')
-                        msg_parts.append(' '.join('{%s.denom%d:value}'%(param,i) for i, measure in enumerate(denominator)))
-                        for i, measure in enumerate(denominator):
-                            msg_params['%s.denom%d'%(param,i)] = xbrl.Error.Param(measure.value.local_name,tooltip=str(measure.value),location=measure,quotes=False)
-                else:
-                    msg_parts.append('none')
-            elif param_parts[1] == 'decimals':
-                msg_parts.append('{%s}'%param)
-                msg_params[param] = xbrl.Error.Param(str(fact.decimals),location=fact.element.find_attribute('decimals'),quotes=False)
+        self.name = param_parts[0]
+        self.key = param.replace(':','_')
+
+        fact_parts = param_parts[2:] if len(param_parts) > 2 and param_parts[1] == 'fact' else param_parts[1:]
+        fact_property = '.'.join(fact_parts)
+        self.fact_renderer = fact_renderers.get(fact_property)
+        if self.fact_renderer is None and fact_parts and fact_parts[0] == 'period' and len(fact_parts) > 1:
+            self.fact_error = 'Unknown period property '+fact_parts[1]
+        else:
+            self.fact_error = 'Unknown fact property '+fact_parts[0] if fact_parts else 'Missing fact property'
+        self.concept_renderer = concept_renderers.get(param_parts[1]) if len(param_parts) > 1 else None
+
+    def render(self,kargs,msg_parts,msg_params,periods):
+        if self.name not in kargs:
+            raise KeyError('Missing value for parameter '+self.name)
+        value = kargs[self.name]
+
+        if isinstance(value,xbrl.Fact):
+            if self.fact_renderer is None:
+                raise KeyError(self.fact_error)
+            self.fact_renderer(self.key,value,msg_parts,msg_params,periods)
+        elif isinstance(value,xbrl.taxonomy.Concept):
+            if self.concept_renderer is not None:
+                self.concept_renderer(self.key,value,msg_parts,msg_params)
+        elif isinstance(value,RuleInfo):
+            msg_parts.append('{%s}'%self.key)
+            msg_params[self.key] = xbrl.Error.Param(value.ruleVersion,tooltip=value.releaseDate,quotes=False)
+        else:
+            msg_parts.append('{%s}'%self.key)
+            msg_params[self.key] = xbrl.Error.Param(str(value),quotes=False)
+
+class MessageTemplate(object):
+    """A message template which has been compiled once into a list of literal text and MessageParam tokens."""
+
+    def __init__(self,msg):
+        self.tokens = []
+        text_start = 0
+        while True:
+            param_start = msg.find('${',text_start)
+            if param_start == -1:
+                if text_start < len(msg):
+                    self.tokens.append(msg[text_start:])
+                break
+            if text_start < param_start:
+                self.tokens.append(msg[text_start:param_start])
+            param_start += 2
+            param_end = msg.find('}',param_start)
+            self.tokens.append(MessageParam(msg[param_start:param_end]))
+            text_start = param_end+1
+
+    def render(self,location,severity,children,kargs,prefix='',periods=None):
+        """Creates a xbrl.Error object from the compiled template and the given arguments. The periods of facts are looked up in the given PeriodCache."""
+        if periods is None:
+            periods = PeriodCache()
+        msg_parts = [prefix]
+        msg_params = {}
+        for token in self.tokens:
+            if isinstance(token,str):
+                msg_parts.append(token)
             else:
-                raise KeyError('Unknown fact property '+param_parts[1])
-
-        elif isinstance(kargs[param_parts[0]],xbrl.taxonomy.Concept):
-            concept = kargs[param_parts[0]]
-
-            if param_parts[1] == 'name':
-                msg_parts.append('{%s}'%param)
-                msg_params[param] = xbrl.Error.Param(prefixed_name(concept),tooltip=str(concept.qname),deflocation=concept,quotes=False)
-            elif param_parts[1] == 'localName':
-                msg_parts.append('{%s}'%param)
-                msg_params[param] = xbrl.Error.Param(concept.name,tooltip=str(concept.qname),deflocation=concept,quotes=False)
-            elif param_parts[1] == 'label':
-                msg_parts.append('{%s}'%param)
-                msg_params[param] = xbrl.Error.Param(label(concept),tooltip=str(concept.qname),deflocation=concept,quotes=False)
-
-        elif isinstance(kargs[param_parts[0]],RuleInfo):
-            ruleVersion = kargs[param_parts[0]]
-            msg_parts.append('{%s}'%param)
-            msg_params[param] = xbrl.Error.Param(ruleVersion.ruleVersion,tooltip=ruleVersion.releaseDate,quotes=False)
+                token.render(kargs,msg_parts,msg_params,periods)
+        return xbrl.Error.create(''.join(msg_parts), location=location, severity=severity, children=children, **msg_params )
 
-        else:
-            msg_parts.append('{%s}'%param)
-            msg_params[param] = xbrl.Error.Param(str(kargs[param_parts[0]]),quotes=False)
+CompiledMessage = collections.namedtuple('CompiledMessage',['msg','hint','ruleInfo'])
 
-        text_start = param_end+1
+compiled_msg_template_properties = [MessageTemplate(line) for line in msg_template_properties]
+compiled_msg_templates = {}
 
-    return xbrl.Error.create(''.join(msg_parts), location=location, severity=severity, children=children, **msg_params )
+def compiled_msg_template(rule_id):
+    """Returns the CompiledMessage for the given error code or for the error code without the test case number. The templates are compiled on first use."""
+    msg = compiled_msg_templates.get(rule_id)
+    if msg is None:
+        msg_templates = dqc_reference_data.load().msg_templates
+        key = rule_id if rule_id in msg_templates else rule_id.rsplit('.',1)[0]
+        template = msg_templates[key]
+        msg = CompiledMessage(MessageTemplate(template['msg']),MessageTemplate(template['hint']) if 'hint' in template else None,RuleInfo(*template['version']))
+        compiled_msg_templates[rule_id] = msg
+    return msg
 
-def report_error(error_log,suppress_errors,rule_id,**kargs):
-    """Constructs and reports an error given an error code and additional arguments. This function creates xbrl.Error objects according to the associated message template and adds it to the error log."""
-    if rule_id in suppress_errors:
-        return
-    if rule_id in msg_templates:
-        msg = msg_templates[rule_id]
-    else:
-        # Remove test case number
-        msg = msg_templates[rule_id.rsplit('.',1)[0]]
-    kargs['ruleVersion'] = RuleInfo(*msg['version'])
+_adhoc_msg_templates = {}
 
-    property_lines = []
-    for line in msg_template_properties[1:]:
-        property_lines.append(create_error(line,None,xml.ErrorSeverity.OTHER,None,**kargs))
+def create_error(msg,location,severity,children,**kargs):
+    """Creates a xbrl.Error object from a message template msg and other arguments depending on the template."""
+    template = _adhoc_msg_templates.get(msg)
+    if template is None:
+        template = MessageTemplate(msg)
+        _adhoc_msg_templates[msg] = template
+    return template.render(location,severity,children,kargs)
+
+def render_error(rule_id,kargs,periods=None):
+    """Creates the xbrl.Error object for the given error code and arguments according to the associated message template. The periods of facts are looked up in the given PeriodCache."""
+    if periods is None:
+        periods = PeriodCache()
+    msg = compiled_msg_template(rule_id)
+    kargs = dict(kargs,ruleVersion=msg.ruleInfo)
+
+    property_lines = [template.render(None,xml.ErrorSeverity.OTHER,None,kargs,periods=periods) for template in compiled_msg_template_properties[1:]]
 
     child_lines = []
-    if 'hint' in msg:
-        child_lines.append(create_error(msg['hint'],None,xml.ErrorSeverity.INFO,None,**kargs))
-    child_lines.append(create_error(msg_template_properties[0],None,xml.ErrorSeverity.OTHER,property_lines,**kargs))
+    if msg.hint:
+        child_lines.append(msg.hint.render(None,xml.ErrorSeverity.INFO,None,kargs,periods=periods))
+    child_lines.append(compiled_msg_template_properties[0].render(None,xml.ErrorSeverity.OTHER,property_lines,kargs,periods=periods))
+
+    return msg.msg.render(kargs['fact1'],xml.ErrorSeverity.ERROR,child_lines,kargs,prefix='[%s] ' % rule_id,periods=periods)
+
+class DeferredErrorLog(object):
+    """Collects DQC errors as (rule_id, arguments) pairs holding references to the offending facts. The xbrl.Error objects are only created when the log is iterated or flushed to a RaptorXML error log."""
+
+    def __init__(self,periods=None):
+        self.entries = []
+        self.periods = periods if periods is not None else PeriodCache()
+
+    def __len__(self):
+        return len(self.entries)
 
-    msg_text = '[%s] %s' % (rule_id,msg['msg'])
-    error_log.report(create_error(msg_text,kargs['fact1'],xml.ErrorSeverity.ERROR,child_lines,**kargs))
+    def __iter__(self):
+        for rule_id, kargs in self.entries:
+            yield render_error(rule_id,kargs,self.periods)
+
+    def add(self,rule_id,kargs):
+        self.entries.append((rule_id,kargs))
+
+    def rule_ids(self):
+        """Returns the error codes of all collected errors without rendering any messages."""
+        return [rule_id for rule_id, kargs in self.entries]
+
+    def flush(self,error_log):
+        """Renders all collected errors, reports them to error_log and empties this log. If error_log is itself a DeferredErrorLog, the entries are moved without rendering."""
+        if isinstance(error_log,DeferredErrorLog):
+            error_log.entries.extend(self.entries)
+        else:
+            for error in self:
+                error_log.report(error)
+        self.entries = []
+
+def report_error(error_log,suppress_errors,rule_id,**kargs):
+    """Constructs and reports an error given an error code and additional arguments. This function creates xbrl.Error objects according to the associated message template and adds it to the error log. If error_log is a DeferredErrorLog, only the arguments are recorded and the error is rendered later."""
+    if rule_id in suppress_errors:
+        return
+    if isinstance(error_log,DeferredErrorLog):
+        error_log.add(rule_id,kargs)
+    else:
+        error_log.report(render_error(rule_id,kargs))
 
 def decimal_comparison(fact1,fact2,cmp):
     """Rounds both numerical facts to the least accurate precision of both facts and calls the given cmp function with the rounded decimal values."""
-    # When comparing two numeric fact values in a rule, the comparison needs to take into account different decimals. Numbers are compared based on the lowest decimal value rounded per XBRL specification. For example, the number 532,000,000 with decimals of -6 is considered to be equivalent to 532,300,000 with a decimals value of -5. In this case the 532,300,000 is rounded to a million and then compared to the value of 532,000,000. (Note that XBRL specifies "round half to nearest even" so 532,500,000 with decimals -6 rounds to 532,000,000, and 532,500,001 rounds to 533,000,000.)
-    decimals = min(fact1.decimals,fact2.decimals)
-    if decimals == float('inf'):
-        return cmp(fact1.numeric_value,fact2.numeric_value)
-    val1 = fact1.numeric_value.scaleb(decimals).quantize(1,decimal.ROUND_HALF_EVEN).scaleb(-decimals)
-    val2 = fact2.numeric_value.scaleb(decimals).quantize(1,decimal.ROUND_HALF_EVEN).scaleb(-decimals)
-    return cmp(val1,val2,decimals)
-
-def equal_within_tolerance(val1,val2,decimals=None):
-    """Returns true if va1 is equal to val2 within given tolerance."""
-    # The rule allows a tolerance for rounding between the values tested of 2 based on the scale of the values. For example, if the values are reported in millions, the rounding tolerance would be $2 million.
-    if decimals is None:
-        return val1 == val2
-    return abs(val1-val2) <= decimal.Decimal(2).scaleb(-decimals)
-
-def less_or_equal(val1,val2,decimals=None):
-    """Returns true if va1 is less or equal than val2."""
-    return val1 <= val2
+    return xbrl_decimals.compare(fact1.numeric_value,fact1.decimals,fact2.numeric_value,fact2.decimals,cmp)
+
+equal_within_tolerance = xbrl_decimals.equal_within_tolerance
+less_or_equal = xbrl_decimals.less_or_equal
 
 def dimension_value(fact,dim):
     """Returns the domain member for the given dimension aspect or None if fact does not have this dimension aspect."""
     aspect_value = fact.dimension_aspect_value(dim)
     return aspect_value.value if aspect_value else None
 
-def reporting_period_ends(instance,dei_namespace):
+def reporting_period_ends(instance,dei_namespace,facts):
     """Returns a dict of DocumentPeriodEndDate fact and end date tuples keyed by the legal entity domain member."""
 
     reporting_period_end_for_legal_entity = {}
 
     dim_LegalEntityAxis = instance.dts.resolve_concept(xml.QName('LegalEntityAxis',dei_namespace))
     concept_DocumentPeriodEndDate = instance.dts.resolve_concept(xml.QName('DocumentPeriodEndDate',dei_namespace))
-    for fact in instance.facts.filter(concept_DocumentPeriodEndDate):
+    for fact in facts.concept(concept_DocumentPeriodEndDate):
         # Amendment: Use the period end date of the context and not the DocumentPeriodEndDate value! 
         end_date = fact.period_aspect_value.end
 
@@ -313,133 +430,266 @@ def reporting_period_ends(instance,dei_namespace):
 
     return reporting_period_end_for_legal_entity
 
-def textblock_facts(instance):
-    """Returns an xbrl.FactSet object with facts whose concept's item type is or is derived from textBlockItemType."""
-    facts = xbrl.FactSet()
-
-    type_textBlockItemType = instance.dts.schema.resolve_type_definition(xml.QName('textBlockItemType','http://www.xbrl.org/dtr/type/non-numeric'))
-    if type_textBlockItemType:
-
-        is_textblock_cache = {}
-        for fact in instance.facts:
-            is_textblock = is_textblock_cache.get(fact.concept,None)
-            if is_textblock is None:
-                is_textblock = fact.concept.type_definition.is_derived_from(type_textBlockItemType)
-                is_textblock_cache[fact.concept] = is_textblock
-
-            if is_textblock:
-                facts.add(fact)
-
-    return facts
-
-def facts_in_namespace(instance,namespace,ignored):
-    """Returns an xbrl.FactSet object with facts whose concept is in the given namespace."""
-
-    facts = xbrl.FactSet()
-    for fact in instance.facts:
-        qname = fact.qname
-        if qname.namespace_name == namespace and qname.local_name not in ignored:
-            facts.add(fact)
-    return facts
-
-def _dqc_0004(instance,error_log,suppress_errors,rule_id,concept1,concept2):
+class FactDispatcher(object):
+    """Routes the facts of an instance to the buckets registered by the DQC rules in a single pass over all facts. Rules register their interest in facts of a concept, a namespace, an item type or an explicit dimension before dispatch() is called and consume the filled buckets afterwards. The dispatcher also holds the PeriodCache shared by all rules and by the rendering of their errors."""
+
+    def __init__(self,instance):
+        self.instance = instance
+        self.concepts = {}
+        self.namespaces = {}
+        self.item_types = {}
+        self.dimensions = {}
+        self.dispatched = False
+        self.fact_count = 0
+        self.requested = None
+        self.periods = PeriodCache()
+
+    def _bucket(self,buckets,key):
+        bucket = buckets.get(key)
+        if bucket is None:
+            if self.dispatched:
+                raise RuntimeError('Facts for %s were not registered before dispatching.' % str(key))
+            bucket = []
+            buckets[key] = bucket
+        if self.requested is not None:
+            self.requested[id(bucket)] = bucket
+        return bucket
+
+    def record_requests(self):
+        """Starts recording the buckets requested from this dispatcher and returns the dict in which they are recorded."""
+        self.requested = {}
+        return self.requested
+
+    def concept(self,concept):
+        """Returns the list of facts of the given concept."""
+        if concept is None:
+            return []
+        return self._bucket(self.concepts,concept)
+
+    def namespace(self,namespace,ignored=()):
+        """Returns the list of facts whose concept is in the given namespace and whose local name is not in ignored."""
+        return self._bucket(self.namespaces,(namespace,frozenset(ignored)))
+
+    def item_type(self,type_definition):
+        """Returns the list of facts whose concept's type is or is derived from the given type definition."""
+        if type_definition is None:
+            return []
+        return self._bucket(self.item_types,type_definition)
+
+    def dimension(self,dimension,member=None):
+        """Returns the list of facts which have an explicit value for the given dimension, or if member is given, which have this domain member for the given dimension."""
+        if dimension is None:
+            return []
+        return self._bucket(self.dimensions,(dimension,member))
+
+    def _concept_routes(self,concept):
+        routes = []
+        if concept in self.concepts:
+            routes.append(self.concepts[concept])
+        if self.namespaces:
+            qname = concept.qname
+            for (namespace,ignored), bucket in self.namespaces.items():
+                if qname.namespace_name == namespace and qname.local_name not in ignored:
+                    routes.append(bucket)
+        if self.item_types:
+            type_definition = concept.type_definition
+            for item_type, bucket in self.item_types.items():
+                if type_definition.is_derived_from(item_type):
+                    routes.append(bucket)
+        return routes
+
+    def _context_routes(self,fact):
+        routes = []
+        for (dimension,member), bucket in self.dimensions.items():
+            value = dimension_value(fact,dimension)
+            if value is not None and (value == member if member is not None else value != dimension.default_member):
+                routes.append(bucket)
+        return routes
+
+    def dispatch(self):
+        """Iterates once over all facts of the instance and appends each fact to every registered bucket it belongs to."""
+        concept_routes = {}
+        context_routes = {}
+        for fact in self.instance.facts:
+            self.fact_count += 1
+            routes = concept_routes.get(fact.concept)
+            if routes is None:
+                routes = self._concept_routes(fact.concept)
+                concept_routes[fact.concept] = routes
+            for bucket in routes:
+                bucket.append(fact)
+
+            if self.dimensions and isinstance(fact,xbrl.Item):
+                routes = context_routes.get(fact.contextRef)
+                if routes is None:
+                    routes = self._context_routes(fact)
+                    context_routes[fact.contextRef] = routes
+                for bucket in routes:
+                    bucket.append(fact)
+        self.dispatched = True
+
+class FactJoin(object):
+    """Hash join of facts reported in equivalent dimensions. Facts are bucketed by a canonical key of all aspects except the concept (entity, period, dimensions and unit), so that all fact pairs of two concepts with equal aspects are found in time linear to the number of facts."""
+
+    def __init__(self,facts):
+        self.facts = facts
+        self.context_keys = {}
+        self.indexes = {}
+
+    def key(self,fact):
+        """Returns the canonical key of all aspects of the fact except the concept."""
+        context_key = self.context_keys.get(fact.contextRef)
+        if context_key is None:
+            context_key = xbrl.ConstraintSet(fact.context)
+            self.context_keys[fact.contextRef] = context_key
+        return (context_key, fact.unit.aspect_value if fact.unit else None)
+
+    def index(self,concept):
+        """Returns a dict with lists of non-nil facts of the given concept keyed by their canonical aspect key."""
+        index = self.indexes.get(concept)
+        if index is None:
+            index = {}
+            for fact in self.facts.concept(concept):
+                if not fact.xsi_nil:
+                    index.setdefault(self.key(fact),[]).append(fact)
+            self.indexes[concept] = index
+        return index
+
+    def pairs(self,concept1,concept2):
+        """Yields all (fact1, fact2) pairs of non-nil facts of concept1 and concept2 reported in equivalent dimensions."""
+        index = self.index(concept2)
+        if index:
+            for fact1 in self.facts.concept(concept1):
+                if not fact1.xsi_nil:
+                    for fact2 in index.get(self.key(fact1),()):
+                        yield fact1, fact2
+
+def _dqc_0004(instance,error_log,suppress_errors,rule_id,concept1,concept2,join):
     """DQC_0004 Element Values Are Equal"""
 
-    for fact1 in instance.facts.filter(concept1,allow_nil=False):
-        # All comparisons between fact values occur between facts of equivalent dimensions. A rule will produce a message for each occurrence of the compared facts in equivalent dimensions.
-        cs = xbrl.ConstraintSet(fact1)
-        cs[xbrl.Aspect.CONCEPT] = concept2
-        for fact2 in instance.facts.filter(cs,allow_nil=False,allow_additional_dimensions=False):
-            if not decimal_comparison(fact1,fact2,equal_within_tolerance):
-                report_error(error_log,suppress_errors,rule_id,fact1=fact1,fact2=fact2)
+    # All comparisons between fact values occur between facts of equivalent dimensions. A rule will produce a message for each occurrence of the compared facts in equivalent dimensions.
+    for fact1, fact2 in join.pairs(concept1,concept2):
+        if not decimal_comparison(fact1,fact2,equal_within_tolerance):
+            report_error(error_log,suppress_errors,rule_id,fact1=fact1,fact2=fact2)
 
-def dqc_0004_16(instance,error_log,suppress_errors,namespaces):
+def dqc_0004_16(instance,error_log,suppress_errors,namespaces,facts):
     """DQC_0004 Element Values Are Equal"""
 
     concept_Assets = instance.dts.resolve_concept(xml.QName('Assets',namespaces.get('us-gaap')))
     concept_LiabilitiesAndStockholdersEquity = instance.dts.resolve_concept(xml.QName('LiabilitiesAndStockholdersEquity',namespaces.get('us-gaap')))
     if concept_Assets and concept_LiabilitiesAndStockholdersEquity:
-        _dqc_0004(instance,error_log,suppress_errors,'DQC.US.0004.16',concept_Assets,concept_LiabilitiesAndStockholdersEquity)
+        _dqc_0004(instance,error_log,suppress_errors,'DQC.US.0004.16',concept_Assets,concept_LiabilitiesAndStockholdersEquity,FactJoin(facts))
 
-def dqc_0004(instance,error_log,suppress_errors,namespaces):
+def dqc_0004_inputs(instance,namespaces,suppress_errors,facts):
+    """Registers the facts used by DQC_0004."""
+
+    facts.concept(instance.dts.resolve_concept(xml.QName('Assets',namespaces.get('us-gaap'))))
+    facts.concept(instance.dts.resolve_concept(xml.QName('LiabilitiesAndStockholdersEquity',namespaces.get('us-gaap'))))
+
+def dqc_0004(instance,error_log,suppress_errors,namespaces,facts):
     """DQC_0004 Element Values Are Equal"""
 
-    dqc_0004_16(instance,error_log,suppress_errors,namespaces)
+    dqc_0004_16(instance,error_log,suppress_errors,namespaces,facts)
 
-def _dqc_0005(instance,error_log,suppress_errors,rule_id,namespaces,facts,reporting_period_ends,cmp,additional_params={}):
+def _dqc_0005(instance,error_log,suppress_errors,rule_id,namespaces,facts,periods,reporting_period_ends,cmp,additional_params={}):
     """DQC_0005.17 Entity Common Stock, Shares Outstanding"""
 
     dim_LegalEntityAxis = instance.dts.resolve_concept(xml.QName('LegalEntityAxis',namespaces['dei']))
-    concept_EntityCommonStockSharesOutstanding = instance.dts.resolve_concept(xml.QName('EntityCommonStockSharesOutstanding',namespaces['dei']))
     for fact1 in facts:
 
         reporting_period_end = reporting_period_ends.get(dimension_value(fact1,dim_LegalEntityAxis))
         if not reporting_period_end:
             reporting_period_end = reporting_period_ends.get(dim_LegalEntityAxis.default_member)
 
-        if reporting_period_end and not cmp(period_end(fact1),reporting_period_end[1]):
+        if reporting_period_end and not cmp(period_end(fact1,periods),reporting_period_end[1]):
             params = {'fact1':fact1,'dei:DocumentPeriodEndDate':reporting_period_end[0]}
             params.update(additional_params)
             report_error(error_log,suppress_errors,rule_id,**params)
 
-def dqc_0005_17(instance,error_log,suppress_errors,namespaces,reporting_period_ends):
+def dqc_0005_17(instance,error_log,suppress_errors,namespaces,reporting_period_ends,facts):
     """DQC_0005.17 Entity Common Stock, Shares Outstanding"""
 
     concept_EntityCommonStockSharesOutstanding = instance.dts.resolve_concept(xml.QName('EntityCommonStockSharesOutstanding',namespaces['dei']))
+    _dqc_0005(instance,error_log,suppress_errors,'DQC.US.0005.17',namespaces,facts.concept(concept_EntityCommonStockSharesOutstanding),facts.periods,reporting_period_ends,operator.ge)
 
-    facts = instance.facts.filter(concept_EntityCommonStockSharesOutstanding)
-    _dqc_0005(instance,error_log,suppress_errors,'DQC.US.0005.17',namespaces,facts,reporting_period_ends,operator.ge)
-
-def dqc_0005_48(instance,error_log,suppress_errors,namespaces,reporting_period_ends):
+def dqc_0005_48(instance,error_log,suppress_errors,namespaces,reporting_period_ends,facts):
     """DQC_0005.48 Subsequent events"""
 
     dim_SubsequentEventTypeAxis = instance.dts.resolve_concept(xml.QName('SubsequentEventTypeAxis',namespaces.get('us-gaap')))
     if dim_SubsequentEventTypeAxis:
+        _dqc_0005(instance,error_log,suppress_errors,'DQC.US.0005.48',namespaces,facts.dimension(dim_SubsequentEventTypeAxis),facts.periods,reporting_period_ends,operator.gt,{'us-gaap:SubsequentEventTypeAxis':dim_SubsequentEventTypeAxis})
 
-        cs = xbrl.ConstraintSet()
-        cs[dim_SubsequentEventTypeAxis] = xbrl.ExplicitDimensionAspectValue(dim_SubsequentEventTypeAxis,None)
-        facts = instance.facts - instance.facts.filter(cs)
-        _dqc_0005(instance,error_log,suppress_errors,'DQC.US.0005.48',namespaces,facts,reporting_period_ends,operator.gt,{'us-gaap:SubsequentEventTypeAxis':dim_SubsequentEventTypeAxis})
-
-def dqc_0005_49(instance,error_log,suppress_errors,namespaces,reporting_period_ends):
+def dqc_0005_49(instance,error_log,suppress_errors,namespaces,reporting_period_ends,facts):
     """DQC_0005.49 Subsequent events"""
 
     dim_StatementScenarioAxis = instance.dts.resolve_concept(xml.QName('StatementScenarioAxis',namespaces.get('us-gaap')))
     if dim_StatementScenarioAxis:
         member_ScenarioForecastMember = instance.dts.resolve_concept(xml.QName('ScenarioForecastMember',namespaces.get('us-gaap')))
+        _dqc_0005(instance,error_log,suppress_errors,'DQC.US.0005.49',namespaces,facts.dimension(dim_StatementScenarioAxis,member_ScenarioForecastMember),facts.periods,reporting_period_ends,operator.gt,{'us-gaap:StatementScenarioAxis':dim_StatementScenarioAxis,'us-gaap:ScenarioForecastMember':member_ScenarioForecastMember})
 
-        cs = xbrl.ConstraintSet()
-        cs[dim_StatementScenarioAxis] = member_ScenarioForecastMember
-        facts = instance.facts.filter(cs)
-        _dqc_0005(instance,error_log,suppress_errors,'DQC.US.0005.49',namespaces,facts,reporting_period_ends,operator.gt,{'us-gaap:StatementScenarioAxis':dim_StatementScenarioAxis,'us-gaap:ScenarioForecastMember':member_ScenarioForecastMember})
+def dqc_0005_inputs(instance,namespaces,suppress_errors,facts):
+    """Registers the facts used by DQC_0005."""
 
-def dqc_0005(instance,error_log,suppress_errors,namespaces):
+    facts.concept(instance.dts.resolve_concept(xml.QName('DocumentPeriodEndDate',namespaces['dei'])))
+    if 'DQC.US.0005.17' not in suppress_errors:
+        facts.concept(instance.dts.resolve_concept(xml.QName('EntityCommonStockSharesOutstanding',namespaces['dei'])))
+    if 'DQC.US.0005.48' not in suppress_errors:
+        facts.dimension(instance.dts.resolve_concept(xml.QName('SubsequentEventTypeAxis',namespaces.get('us-gaap'))))
+    dim_StatementScenarioAxis = instance.dts.resolve_concept(xml.QName('StatementScenarioAxis',namespaces.get('us-gaap')))
+    if dim_StatementScenarioAxis and 'DQC.US.0005.49' not in suppress_errors:
+        facts.dimension(dim_StatementScenarioAxis,instance.dts.resolve_concept(xml.QName('ScenarioForecastMember',namespaces.get('us-gaap'))))
+
+def dqc_0005(instance,error_log,suppress_errors,namespaces,facts):
     """DQC_0005 Context Dates After Period End Date"""
 
-    reporting_periods = reporting_period_ends(instance,namespaces['dei'])
-    dqc_0005_17(instance,error_log,suppress_errors,namespaces,reporting_periods)
-    dqc_0005_48(instance,error_log,suppress_errors,namespaces,reporting_periods)
-    dqc_0005_49(instance,error_log,suppress_errors,namespaces,reporting_periods)
+    reporting_periods = reporting_period_ends(instance,namespaces['dei'],facts)
+    if 'DQC.US.0005.17' not in suppress_errors:
+        dqc_0005_17(instance,error_log,suppress_errors,namespaces,reporting_periods,facts)
+    if 'DQC.US.0005.48' not in suppress_errors:
+        dqc_0005_48(instance,error_log,suppress_errors,namespaces,reporting_periods,facts)
+    if 'DQC.US.0005.49' not in suppress_errors:
+        dqc_0005_49(instance,error_log,suppress_errors,namespaces,reporting_periods,facts)
 
-def _dqc_0006(instance,error_log,suppress_errors,dim_LegalEntityAxis,period_focus_for_legal_entity,facts):
+def _dqc_0006(instance,error_log,suppress_errors,dim_LegalEntityAxis,period_focus_for_legal_entity,facts,periods):
     """DQC_0006 DEI and Block Tag Date Contexts """
 
+    period_focus_durations = dqc_reference_data.load().dqc_0006_period_focus_durations
     for fact1 in facts:
 
         period_focus = period_focus_for_legal_entity.get(dimension_value(fact1,dim_LegalEntityAxis))
         if not period_focus:
             period_focus = period_focus_for_legal_entity.get(dim_LegalEntityAxis.default_member)
-        if period_focus and period_focus.normalized_value in dqc_0006_period_focus_durations:
+        if period_focus and period_focus.normalized_value in period_focus_durations:
 
-            duration = dqc_0006_period_focus_durations.get(period_focus.normalized_value)
-            if not duration[0] <= period_duration(fact1) <= duration[1]:
+            duration = period_focus_durations.get(period_focus.normalized_value)
+            if not duration[0] <= period_duration(fact1,periods) <= duration[1]:
                 report_error(error_log,suppress_errors,'DQC.US.0006.14',**{'fact1':fact1,'dei:DocumentFiscalPeriodFocus':period_focus})
 
-def dqc_0006(instance,error_log,suppress_errors,namespaces):
+dqc_0006_fact_names = [
+    'AmendmentDescription',
+    'AmendmentFlag',
+    'CurrentFiscalYearEndDate',
+    'DocumentPeriodEndDate',
+    'DocumentFiscalYearFocus',
+    'DocumentFiscalPeriodFocus',
+    'DocumentType',
+    'EntityRegistrantName',
+    'EntityCentralIndexKey',
+    'EntityFilerCategory',
+]
+
+def dqc_0006_inputs(instance,namespaces,suppress_errors,facts):
+    """Registers the facts used by DQC_0006."""
+
+    for name in dqc_0006_fact_names:
+        facts.concept(instance.dts.resolve_concept(xml.QName(name,namespaces['dei'])))
+    facts.item_type(instance.dts.schema.resolve_type_definition(xml.QName('textBlockItemType','http://www.xbrl.org/dtr/type/non-numeric')))
+
+def dqc_0006(instance,error_log,suppress_errors,namespaces,facts):
     """DQC_0006 DEI and Block Tag Date Contexts"""
 
     concept_DocumentType = instance.dts.resolve_concept(xml.QName('DocumentType',namespaces['dei']))
-    facts_DocumentType = instance.facts.filter(concept_DocumentType)
+    facts_DocumentType = facts.concept(concept_DocumentType)
     if len(facts_DocumentType) != 1 or facts_DocumentType[0].normalized_value.endswith('T') or facts_DocumentType[0].normalized_value.endswith('T/A'):
         # This rule also does not test any transition period filings, which are identified by the letter "T" in the form name.
         # Transition period filings are submitted when a filer changes their fiscal year.
@@ -450,81 +700,110 @@ def dqc_0006(instance,error_log,suppress_errors,namespaces):
     concept_DocumentFiscalPeriodFocus = instance.dts.resolve_concept(xml.QName('DocumentFiscalPeriodFocus',namespaces['dei']))
 
     period_focus_for_legal_entity = {}
-    for fact in instance.facts.filter(concept_DocumentFiscalPeriodFocus):
+    for fact in facts.concept(concept_DocumentFiscalPeriodFocus):
         period_focus_for_legal_entity[dimension_value(fact,dim_LegalEntityAxis)] = fact
 
-    fact_names = [
-        'AmendmentDescription',
-        'AmendmentFlag',
-        'CurrentFiscalYearEndDate',
-        'DocumentPeriodEndDate',
-        'DocumentFiscalYearFocus',
-        'DocumentFiscalPeriodFocus',
-        'DocumentType',
-        'EntityRegistrantName',
-        'EntityCentralIndexKey',
-        'EntityFilerCategory',
-    ]
-
-    for name in fact_names:
+    for name in dqc_0006_fact_names:
         concept = instance.dts.resolve_concept(xml.QName(name,namespaces['dei']))
         if concept:
-            _dqc_0006(instance,error_log,suppress_errors,dim_LegalEntityAxis,period_focus_for_legal_entity,instance.facts.filter(concept))
-
-    _dqc_0006(instance,error_log,suppress_errors,dim_LegalEntityAxis,period_focus_for_legal_entity,textblock_facts(instance))
+            _dqc_0006(instance,error_log,suppress_errors,dim_LegalEntityAxis,period_focus_for_legal_entity,facts.concept(concept),facts.periods)
 
-def dqc_0009(instance,error_log,suppress_errors,namespaces):
-    """DQC_0009 Element A must be less than or equal to Element B"""
-
-    for rule_id, prefix1, name1, prefix2, name2 in dqc_0009_facts:
+    type_textBlockItemType = instance.dts.schema.resolve_type_definition(xml.QName('textBlockItemType','http://www.xbrl.org/dtr/type/non-numeric'))
+    _dqc_0006(instance,error_log,suppress_errors,dim_LegalEntityAxis,period_focus_for_legal_entity,facts.item_type(type_textBlockItemType),facts.periods)
+
+def _dqc_0009_rules(instance,namespaces,suppress_errors):
+    """Returns a list of (rule_id, concept1, concept2) tuples for all DQC_0009 rules which are not suppressed and whose concepts exist in the DTS."""
+    rules = []
+    for rule_id, prefix1, name1, prefix2, name2 in dqc_reference_data.load().dqc_0009_facts:
+        if rule_id in suppress_errors:
+            continue
         concept1 = instance.dts.resolve_concept(xml.QName(name1,namespaces.get(prefix1)))
         concept2 = instance.dts.resolve_concept(xml.QName(name2,namespaces.get(prefix2)))
         if concept1 and concept2:
-            for fact1 in instance.facts.filter(concept1,allow_nil=False):
-                # All comparisons between fact values occur between facts of equivalent dimensions.  A rule will produce a message for each occurrence of the compared facts in equivalent dimensions.
-                cs = xbrl.ConstraintSet(fact1)
-                cs[xbrl.Aspect.CONCEPT] = concept2
-                for fact2 in instance.facts.filter(cs,allow_nil=False,allow_additional_dimensions=False):
-                    if not decimal_comparison(fact1,fact2,less_or_equal):
-                        report_error(error_log,suppress_errors,rule_id,fact1=fact1,fact2=fact2)
-
-def _dqc_0015_member_exclusions_test_contains(rule,dim_aspect):
-    name = dim_aspect.value.name if rule['dim'] == 'Member' else dim_aspect.dimension.name
-    return re.search(rule['text'],name,re.IGNORECASE)
-
-def _dqc_0015_member_exclusions_test_equals(rule,dim_aspect):
-    name = dim_aspect.value.name if rule['dim'] == 'Member' else dim_aspect.dimension.name
-    return name == rule['name']
-
-def _dqc_0015_member_exclusions_test(rule,dim_aspect):
-    if rule['test'] == 'Contains the text':
-        return _dqc_0015_member_exclusions_test_contains(rule,dim_aspect)
-    elif rule['test'] == 'Equals':
-        return _dqc_0015_member_exclusions_test_equals(rule,dim_aspect)
-    elif rule['test'] == 'AND':
-        return _dqc_0015_member_exclusions_test(rule['arg1'],dim_aspect) and _dqc_0015_member_exclusions_test(rule['arg2'],dim_aspect)
-    elif rule['test'] == 'OR':
-        return _dqc_0015_member_exclusions_test(rule['arg1'],dim_aspect) or _dqc_0015_member_exclusions_test(rule['arg2'],dim_aspect)
-    raise RuntimeError('Unknown member exclusion test '+rule['test'])
-
-def _dqc_0015_member_exclusions_check(fact):
+            rules.append((rule_id,concept1,concept2))
+    return rules
+
+def dqc_0009_inputs(instance,namespaces,suppress_errors,facts):
+    """Registers the facts used by DQC_0009."""
+
+    for rule_id, concept1, concept2 in _dqc_0009_rules(instance,namespaces,suppress_errors):
+        facts.concept(concept1)
+        facts.concept(concept2)
+
+def dqc_0009(instance,error_log,suppress_errors,namespaces,facts):
+    """DQC_0009 Element A must be less than or equal to Element B"""
+
+    join = FactJoin(facts)
+    for rule_id, concept1, concept2 in _dqc_0009_rules(instance,namespaces,suppress_errors):
+        # All comparisons between fact values occur between facts of equivalent dimensions.  A rule will produce a message for each occurrence of the compared facts in equivalent dimensions.
+        for fact1, fact2 in join.pairs(concept1,concept2):
+            if not decimal_comparison(fact1,fact2,less_or_equal):
+                report_error(error_log,suppress_errors,rule_id,fact1=fact1,fact2=fact2)
+
+_dqc_0015_member_exclusions_matcher = None
+
+def dqc_0015_member_exclusions_matcher(dimension,member):
+    """Returns True if the given dimension and domain member local names are excluded from DQC_0015."""
+    global _dqc_0015_member_exclusions_matcher
+    if _dqc_0015_member_exclusions_matcher is None:
+        _dqc_0015_member_exclusions_matcher = dqc_reference_data.member_exclusions_matcher(dqc_reference_data.load().dqc_0015_member_exclusions_compiled)
+    return _dqc_0015_member_exclusions_matcher(dimension,member)
+
+def _dqc_0015_member_exclusions_check(fact,cache):
+    """Returns True if any dimension aspect of the fact is excluded from DQC_0015. The results are memoized in cache per (dimension, member) pair."""
     for dim_aspect in fact.context.dimension_aspect_values:
-        for rule in dqc_0015_member_exclusions:
-            if _dqc_0015_member_exclusions_test(rule,dim_aspect):
-                return True
+        key = (dim_aspect.dimension,dim_aspect.value)
+        is_excluded = cache.get(key)
+        if is_excluded is None:
+            is_excluded = dqc_0015_member_exclusions_matcher(dim_aspect.dimension.name,dim_aspect.value.name)
+            cache[key] = is_excluded
+        if is_excluded:
+            return True
     return False
 
-def dqc_0015(instance,error_log,suppress_errors,namespaces):
+def _dqc_0015_index(suppress_errors):
+    """Returns the DQC_0015 concept index and the list of its prefixes without the rows whose error codes are suppressed."""
+    reference_data = dqc_reference_data.load()
+    if not suppress_errors.suppresses_any('DQC.US.0015'):
+        return reference_data.dqc_0015_concepts, reference_data.dqc_0015_prefixes
+    concepts = {key: rule_id for key, rule_id in reference_data.dqc_0015_concepts.items() if rule_id not in suppress_errors}
+    return concepts, sorted({prefix for prefix, name in concepts})
+
+def dqc_0015_inputs(instance,namespaces,suppress_errors,facts):
+    """Registers the facts used by DQC_0015."""
+
+    concepts, prefixes = _dqc_0015_index(suppress_errors)
+    for prefix in prefixes:
+        if prefix in namespaces:
+            facts.namespace(namespaces[prefix])
+
+def dqc_0015(instance,error_log,suppress_errors,namespaces,facts):
     """DQC_0015 Negative Values"""
 
-    for rule_id, perfix, name in dqc_0015_facts:
-        concept = instance.dts.resolve_concept(xml.QName(name,namespaces.get(perfix)))
-        if concept:
-            for fact1 in instance.facts.filter(concept,allow_nil=False):
-                if fact1.numeric_value < 0 and not _dqc_0015_member_exclusions_check(fact1):
-                    report_error(error_log,suppress_errors,rule_id,fact1=fact1)
+    concepts, prefixes = _dqc_0015_index(suppress_errors)
+    rule_id_cache = {}
+    exclusion_cache = {}
+    for prefix in prefixes:
+        if prefix not in namespaces:
+            continue
+        for fact1 in facts.namespace(namespaces[prefix]):
+            rule_id = rule_id_cache.get(fact1.concept,False)
+            if rule_id is False:
+                rule_id = concepts.get((prefix,fact1.qname.local_name))
+                rule_id_cache[fact1.concept] = rule_id
+
+            if rule_id and not fact1.xsi_nil and fact1.numeric_value < 0 and not _dqc_0015_member_exclusions_check(fact1,exclusion_cache):
+                report_error(error_log,suppress_errors,rule_id,fact1=fact1)
+
+dqc_0033_ignored_names = ('EntityCommonStockSharesOutstanding','EntityPublicFloat','DocumentPeriodEndDate','EntityNumberOfEmployees','EntityListingDepositoryReceiptRatio')
 
-def dqc_0033(instance,error_log,suppress_errors,namespaces):
+def dqc_0033_inputs(instance,namespaces,suppress_errors,facts):
+    """Registers the facts used by DQC_0033."""
+
+    facts.concept(instance.dts.resolve_concept(xml.QName('DocumentPeriodEndDate',namespaces['dei'])))
+    facts.namespace(namespaces['dei'],dqc_0033_ignored_names)
+
+def dqc_0033(instance,error_log,suppress_errors,namespaces,facts):
     """DQC_0033 Document Period End Date Context"""
 
     dei_namespace = namespaces['dei']
@@ -532,60 +811,223 @@ def dqc_0033(instance,error_log,suppress_errors,namespaces):
 
     reporting_periods = {}
     concept_DocumentPeriodEndDate = instance.dts.resolve_concept(xml.QName('DocumentPeriodEndDate',dei_namespace))
-    for fact1 in instance.facts.filter(concept_DocumentPeriodEndDate):
+    for fact1 in facts.concept(concept_DocumentPeriodEndDate):
         end_date = datetime.datetime.combine(fact1.element.schema_actual_value.value,datetime.time()) + datetime.timedelta(days=1)
         is_valid = abs((end_date - fact1.period_aspect_value.end).days) <= 3
         legal_entity = dimension_value(fact1,dim_LegalEntityAxis)
         reporting_periods[legal_entity] = (fact1,is_valid)
 
-    for fact1 in facts_in_namespace(instance,dei_namespace,('EntityCommonStockSharesOutstanding','EntityPublicFloat','DocumentPeriodEndDate','EntityNumberOfEmployees','EntityListingDepositoryReceiptRatio')):
+    for fact1 in facts.namespace(dei_namespace,dqc_0033_ignored_names):
 
         reporting_period = reporting_periods.get(dimension_value(fact1,dim_LegalEntityAxis))
         if not reporting_period:
             reporting_period = reporting_periods.get(dim_LegalEntityAxis.default_member)
 
-        if reporting_period and reporting_period[1] and period_end(fact1) != period_end(reporting_period[0]):
+        if reporting_period and reporting_period[1] and period_end(fact1,facts.periods) != period_end(reporting_period[0],facts.periods):
             report_error(error_log,suppress_errors,'DQC.US.0033.2',**{'fact1':fact1,'dei:DocumentPeriodEndDate':reporting_period[0]})
 
-def dqc_0036(instance,error_log,suppress_errors,namespaces):
+def dqc_0036_inputs(instance,namespaces,suppress_errors,facts):
+    """Registers the facts used by DQC_0036."""
+
+    facts.concept(instance.dts.resolve_concept(xml.QName('DocumentPeriodEndDate',namespaces['dei'])))
+
+def dqc_0036(instance,error_log,suppress_errors,namespaces,facts):
     """DQC_0036 Document Period End Date Context / Fact Value Check"""
 
     concept_DocumentPeriodEndDate = instance.dts.resolve_concept(xml.QName('DocumentPeriodEndDate',namespaces['dei']))
-    for fact1 in instance.facts.filter(concept_DocumentPeriodEndDate):
+    for fact1 in facts.concept(concept_DocumentPeriodEndDate):
         end_date = datetime.datetime.combine(fact1.element.schema_actual_value.value,datetime.time()) + datetime.timedelta(days=1)
         if abs((end_date - fact1.period_aspect_value.end).days) > 3:
             report_error(error_log,suppress_errors,'DQC.US.0036.1',fact1=fact1)
 
+def dqc_0009_codes():
+    """Returns the error codes of all DQC_0009 rules."""
+    return [rule[0] for rule in dqc_reference_data.load().dqc_0009_facts]
+
+def dqc_0015_codes():
+    """Returns the error codes of all DQC_0015 rules."""
+    return set(dqc_reference_data.load().dqc_0015_concepts.values())
+
+# Registry of all DQC rules in the order in which their errors are reported. The codes function returns all error codes the rule can report, the inputs function registers the facts needed by the rule with the FactDispatcher and the check function performs the validation.
+Rule = collections.namedtuple('Rule',['id','codes','inputs','check'])
+rules = [
+    Rule('DQC.US.0004',lambda: ['DQC.US.0004.16'],dqc_0004_inputs,dqc_0004),
+    Rule('DQC.US.0005',lambda: ['DQC.US.0005.17','DQC.US.0005.48','DQC.US.0005.49'],dqc_0005_inputs,dqc_0005),
+    Rule('DQC.US.0006',lambda: ['DQC.US.0006.14'],dqc_0006_inputs,dqc_0006),
+    Rule('DQC.US.0009',dqc_0009_codes,dqc_0009_inputs,dqc_0009),
+    Rule('DQC.US.0015',dqc_0015_codes,dqc_0015_inputs,dqc_0015),
+    Rule('DQC.US.0033',lambda: ['DQC.US.0033.2'],dqc_0033_inputs,dqc_0033),
+    Rule('DQC.US.0036',lambda: ['DQC.US.0036.1'],dqc_0036_inputs,dqc_0036),
+]
+
+class Suppressions(object):
+    """The set of suppressed DQC error codes. Each entry suppresses the exact error code and, as a rule family prefix, all error codes below it, e.g. DQC.US.0015 or DQC.US.0015.* suppress all DQC.US.0015.nnnn errors."""
+
+    def __init__(self,codes=()):
+        self.entries = set()
+        for code in codes:
+            code = code.strip()
+            if code.endswith('.*'):
+                code = code[:-2]
+            if code:
+                self.entries.add(code)
+        self.cache = {}
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    def __contains__(self,rule_id):
+        """Returns True if the error code rule_id or any of its rule family prefixes is suppressed."""
+        is_suppressed = self.cache.get(rule_id)
+        if is_suppressed is None:
+            parts = rule_id.split('.')
+            is_suppressed = any('.'.join(parts[:i]) in self.entries for i in range(1,len(parts)+1))
+            self.cache[rule_id] = is_suppressed
+        return is_suppressed
+
+    def suppresses_any(self,prefix):
+        """Returns True if any error code of the rule family prefix might be suppressed."""
+        return prefix in self or any(entry.startswith(prefix+'.') for entry in self.entries)
+
+    def suppresses_all(self,codes):
+        """Returns True if all of the given error codes are suppressed."""
+        return all(code in self for code in codes)
+
 def standard_namespaces(dts):
     """Returns a dict of prefix and namespace key/value pairs for standard namespaces."""
-    namespaces = {}
-    for taxonomy in dts.taxonomy_schemas:
-        if taxonomy.target_namespace:
-            for prefix, re in re_namespaces.items():
-                if re.fullmatch(taxonomy.target_namespace):
-                    namespaces[prefix] = taxonomy.target_namespace
-    return namespaces
+    return dqc_reference_data.standard_namespaces(taxonomy.target_namespace for taxonomy in dts.taxonomy_schemas if taxonomy.target_namespace)
 
 def parse_suppress_errors(params):
-    """Returns a list with suppressed error codes."""
+    """Returns a list with suppressed error codes or rule family prefixes."""
     val = params.get('suppressErrors', None)
     if not val:
         return []
     return val.split('|')
 
-def validate(instance,error_log,params={}):
-    """Performs additional validation of xBRL instance according to DQC rules."""
+def parse_rule_ids(params,name):
+    """Returns a set with the DQC.US.nnnn rule ids given in the script parameter name or None if the parameter is not specified."""
+    val = params.get(name, None)
+    if not val:
+        return None
+    return set(rule_id.strip() for rule_id in val.split('|'))
+
+def parse_max_workers(params):
+    """Returns the number of threads used to execute the DQC rules."""
+    return max(int(params.get('maxWorkers', '1')),1)
+
+def enabled_rules(params,suppress_errors=Suppressions()):
+    """Returns the list of rules from the registry which are enabled by the enableRules and disableRules script parameters. Rules whose error codes are all suppressed are not returned."""
+    enabled = parse_rule_ids(params,'enableRules')
+    disabled = parse_rule_ids(params,'disableRules') or set()
+    return [rule for rule in rules if (enabled is None or rule.id in enabled) and rule.id not in disabled and not (suppress_errors and suppress_errors.suppresses_all(rule.codes()))]
+
+def fact_store_rules(instance,rules):
+    """Returns the rules with the checks of the rules implemented in dqc_factstore replaced by checks on a columnar dqc_factstore.FactStore, which is filled once from the instance when the first of them is executed."""
+    import dqc_factstore
+
+    stores = []
+    lock = threading.Lock()
+    def fact_store():
+        with lock:
+            if not stores:
+                stores.append(dqc_factstore.from_instance(instance))
+        return stores[0]
+
+    def fact_store_check(check):
+        def check_rule(instance,error_log,suppress_errors,namespaces,facts):
+            store = fact_store()
+            for finding in check(store,namespaces,suppress_errors):
+                report_error(error_log,suppress_errors,finding.code,**{name: store.sources[row] for name, row in finding.facts.items()})
+        return check_rule
+
+    return [rule._replace(check=fact_store_check(dqc_factstore.rule_checks[rule.id])) if rule.id in dqc_factstore.rule_checks else rule for rule in rules]
+
+def run_rules(instance,error_log,suppress_errors,namespaces,rules,max_workers=1,profiler=validation_profiler.disabled,store=None):
+    """Executes the given rules and reports their errors to error_log. Each rule writes to its own DeferredErrorLog buffer and the buffers are flushed in the order of the rules, so that the reported errors do not depend on max_workers. With max_workers > 1 the rules are executed concurrently on a thread pool. If a dqc_incremental.IncrementalStore is given, rules whose input facts did not change since the last revision are not executed and their cached errors are reported instead."""
+
+    # Collect the facts of all rules in a single pass over the instance facts
+    facts = FactDispatcher(instance)
+    rule_buckets = []
+    for rule in rules:
+        rule_buckets.append(facts.record_requests() if profiler.enabled or store is not None else {})
+        rule.inputs(instance,namespaces,suppress_errors,facts)
+    facts.requested = None
+    with profiler.stage('DQC','dispatch',facts=lambda: facts.fact_count):
+        facts.dispatch()
+
+    buffers = [DeferredErrorLog(facts.periods) for rule in rules]
+    pending = list(zip(rules,buffers,rule_buckets))
+
+    if store is not None:
+        keys = dqc_incremental.FactKeys(instance)
+        fact_hashes = keys.fact_hashes()
+        changed = store.changed_facts(fact_hashes)
+        fingerprints = {}
+        pending = []
+        for rule, buffer, buckets in zip(rules,buffers,rule_buckets):
+            # If no fact changed at all, the inputs of every rule are the same as in the stored revision
+            fingerprint = store.fingerprint(rule.id) if not changed else None
+            if fingerprint is None:
+                fingerprint = keys.fingerprint(fact for bucket in buckets.values() for fact in bucket)
+            entries = store.lookup(rule.id,fingerprint,keys)
+            if entries is None:
+                fingerprints[rule.id] = fingerprint
+                pending.append((rule,buffer,buckets))
+            else:
+                buffer.entries = entries
+
+    def check(rule,buffer,buckets):
+        with profiler.stage('DQC',rule.id,buffer,lambda: sum(len(bucket) for bucket in buckets.values())):
+            rule.check(instance,buffer,suppress_errors,namespaces,facts)
+
+    if max_workers > 1 and len(pending) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers,len(pending))) as executor:
+            futures = [executor.submit(check,rule,buffer,buckets) for rule, buffer, buckets in pending]
+            for future in futures:
+                future.result()
+    else:
+        for rule, buffer, buckets in pending:
+            check(rule,buffer,buckets)
+
+    if store is not None:
+        for rule, buffer, buckets in pending:
+            store.update(rule.id,fingerprints[rule.id],buffer.entries,keys)
+        store.save(fact_hashes)
+
+    for buffer in buffers:
+        buffer.flush(error_log)
+
+def incremental_store(instance,params):
+    """Returns the dqc_incremental.IncrementalStore for the filing if incremental validation is enabled by the incrementalStore script parameter, otherwise None."""
+    directory = params.get('incrementalStore', None)
+    if not directory:
+        return None
+    filing_key = params.get('incrementalKey', None) or instance.uri.rsplit('/',1)[-1]
+    stamp = [__version__,dqc_incremental.__version__,repr(dqc_reference_data.stamp()),params.get('suppressErrors',''),'factStore=%s' % params.get('factStore','false')]+dqc_incremental.document_stamp(instance.dts,instance.uri)
+    return dqc_incremental.IncrementalStore(directory,filing_key,hashlib.sha1('\n'.join(stamp).encode()).hexdigest())
+
+def validate(instance,error_log,params={},profiler=None):
+    """Performs additional validation of xBRL instance according to DQC rules. The error_log can be either a RaptorXML error log or a DeferredErrorLog, in which case the error messages are only rendered on demand. Returns the profiler. If profiler is not given, a validation_profiler.Profiler is used when enabled by the profile script parameter and its memory tracing is stopped before returning."""
+    if profiler is not None:
+        _validate(instance,error_log,params,profiler)
+        return profiler
+    profiler = validation_profiler.Profiler() if validation_profiler.is_enabled(params) else validation_profiler.disabled
+    try:
+        _validate(instance,error_log,params,profiler)
+    finally:
+        profiler.close()
+    return profiler
+
+def _validate(instance,error_log,params,profiler):
     if instance:
-        suppress_errors = set(code.strip() for code in parse_suppress_errors(params))
+        suppress_errors = Suppressions(parse_suppress_errors(params))
         namespaces = standard_namespaces(instance.dts)
         if 'dei' in namespaces:
-            dqc_0004(instance,error_log,suppress_errors,namespaces)
-            dqc_0005(instance,error_log,suppress_errors,namespaces)
-            dqc_0006(instance,error_log,suppress_errors,namespaces)
-            dqc_0009(instance,error_log,suppress_errors,namespaces)
-            dqc_0015(instance,error_log,suppress_errors,namespaces)
-            dqc_0033(instance,error_log,suppress_errors,namespaces)
-            dqc_0036(instance,error_log,suppress_errors,namespaces)
+            rules_to_run = enabled_rules(params,suppress_errors)
+            if params.get('factStore', 'false') == 'true':
+                rules_to_run = fact_store_rules(instance,rules_to_run)
+            with label_cache.scope():
+                run_rules(instance,error_log,suppress_errors,namespaces,rules_to_run,parse_max_workers(params),profiler,incremental_store(instance,params))
 
 # Main script callback entry points. These functions will be called by RaptorXML after the XBRL instance validation job has finished.
 
@@ -594,4 +1036,6 @@ def on_xbrl_finished_dts(job, dts):
 
 def on_xbrl_finished(job, instance):
     # instance object will be None if XBRL 2.1 validation was not successful.
-    validate(instance,job.error_log,job.script_params)
+    profiler = validate(instance,job.error_log,job.script_params)
+    if profiler.enabled:
+        validation_profiler.write_sidecar(job,profiler,job.script_params.get('profileFile','dqc_profile.json'))
@@ -27,6 +27,10 @@ __version__ = '35'
 #   enableDqcValidation         Set to true to enable additional XBRL US Data Quality Committee checks (https://xbrl.us/home/data-quality/rules-guidance/)
 #   edbody-url                  The path to the edbody.dtd used to validate the embedded HTML fragments
 #   edgar-taxonomies-url        The path to the edgartaxonomies.xml which contains a list of taxonomy files that are allowed to be referenced from the company extension taxonomy
+#   profile                     Set to true to record wall time, facts examined, errors emitted and peak allocations of each EFM section and DQC rule
+#   profileFile                 The name of the JSON file in the output directory to which the profile is written (default efm_profile.json)
+#   htmlWorkers                 The number of threads used to validate the HTML of the text blocks concurrently (default 1)
+#   htmlCache                   A local file in which the content hashes of valid text blocks and footnotes are stored, so that they are not validated again in later filings
 #
 # Example invocations:
 #
@@ -43,12 +47,16 @@ import altova_api.v2.xml as xml
 import altova_api.v2.xsd as xsd
 import altova_api.v2.xbrl as xbrl
 
-import os, sys, re, bisect, datetime, decimal, imghdr
-from urllib.request import pathname2url
-from urllib.parse import urljoin
+import os, sys, re, bisect, collections, concurrent.futures, contextlib, datetime, hashlib, imghdr, mmap, threading, types
+from urllib.request import pathname2url, url2pathname
+from urllib.parse import urljoin, urlparse
 
 sys.path.append(os.path.dirname(__file__))
+import cache_files
 import dqc_validation
+import network_graph
+import validation_profiler
+import xbrl_decimals
 
 supported_document_types = {
     # EDGAR Form Types (Corporate Finance):
@@ -252,6 +260,7 @@ re_company_uri = re.compile('http://([^/]+)/(([0-9]{4})([0-9]{2})([0-9]{2})|([0-
 re_authority = re.compile('http://([^/]+)/.*')
 re_encoding = re.compile('encoding\\s*=\\s*(["\'])([A-Za-z0-9._-]*)\\1')
 re_invalid_ascii = re.compile('[^0-9A-Za-z`~!@#$%&*().\\-+ {}[\\]|\\\\:;"\'<>,_?/=\t\n\r\f]')
+re_invalid_ascii_bytes = re.compile(re_invalid_ascii.pattern.encode('ascii'))
 re_xml_uri = re.compile('.*/[^-]+-[0-9]{8}.xml')
 re_xsd_uri = re.compile('.*/[^-]+-[0-9]{8}.xsd')
 re_lab_uri = re.compile('.*/[^-]+-[0-9]{8}_lab.xml')
@@ -265,7 +274,10 @@ re_dei = re.compile('http://xbrl.us/dei/|http://xbrl.sec.gov/dei/')
 re_gaap = re.compile('http://[^/]+/us-gaap/[0-9-]+')
 re_definition = re.compile('[0-9]+ - (Statement|Disclosure|Schedule|Document) -.*[^\s]')
 re_html_stag = re.compile('<[:A-z_a-z][:A-z_a-z.0-9-]*(\s+.*)?/?>')
+re_relative_href = re.compile('[^/:#]*')
+re_href_fragment = re.compile('[a-zA-Z_][a-zA-Z0-9_.-]*')
 re_html_href = re.compile('(http://www.sec.gov/Archives/edgar/data/.+)|(#.+)|([^/.:]+)')
+re_html_img = re.compile('<img[\\s/>]',re.IGNORECASE)
 re_html_src = re.compile('([^/.:]+)\.(jpg|gif)')
 re_period_start_or_end = re.compile('[pP]eriod(Start|End)')
 
@@ -281,28 +293,93 @@ def check_xml_base(elem, error_log):
         if isinstance(child,xml.ElementInformationItem):
             check_xml_base(child, error_log)
 
-def check_valid_ascii(uri, catalog, error_log):
-    # 5.2.1.1 Valid ASCII Characters
-    with altova.open(uri,catalog=catalog,mode='r',encoding='ascii') as f:
+@contextlib.contextmanager
+def open_bytes(uri, catalog):
+    """Yields the raw content of the document as bytes-like object. Local files are memory-mapped instead of being read into memory."""
+    parts = urlparse(catalog.resolve_uri(uri))
+    if parts.scheme == 'file':
         try:
-            for line,s in enumerate(f):
-                if line == 0 and s.startswith('<?xml'):
-                    m = re_encoding.search(s)
-                    if m and m.group(2).lower() not in ('ascii', 'us-ascii', 'iso-8859-1', 'utf-8'):
-                        # For other encodings, do a quick check if it has the same byte representation for us-ascii characters
-                        try:
-                            if 'test'.encode('us-ascii') != 'test'.encode(m.group(2)):
-                                raise UnicodeError('XML document is using \'{}\' encoding which is not compatible with \'US-ASCII\' encoding.'.format(m.group(2)))
-                        except LookupError:
-                            raise UnicodeError('XML document is using unknown \'{}\' encoding.'.format(m.group(2)))
-                m = re_invalid_ascii.search(s)
-                if m:
-                    raise UnicodeError('Invalid ASCII character \'{0}\' found on line {1} column {2}.'.format('\\x%d'%ord(m.group(0)),line+1,m.start(0)+1))             
-        except UnicodeError as e:
-            hint = xbrl.Error.create('{exception}', exception=xbrl.Error.Param(str(e),quotes=False))
-            error_log.report(xbrl.Error.create('[EFM.5.2.1.1] File {uri} is not a valid ASCII dcoument.', uri=uri, children=[hint]))                    
+            f = open(url2pathname(parts.path),'rb')
+        except OSError:
+            f = None
+        if f is not None:
+            with f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    yield b''
+                else:
+                    with mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) as data:
+                        yield data
+            return
+    with altova.open(uri,catalog=catalog,mode='rb') as f:
+        yield f.read()
+
+def check_ascii_bytes(data):
+    """Raises UnicodeError if the XML declaration specifies an encoding incompatible with US-ASCII or if the data contains a byte which is not a valid ASCII character."""
+    if data[:5] == b'<?xml':
+        end = data.find(b'\n',0,1024)
+        m = re_encoding.search(bytes(data[:end if end >= 0 else 1024]).decode('ascii',errors='replace'))
+        if m and m.group(2).lower() not in ('ascii', 'us-ascii', 'iso-8859-1', 'utf-8'):
+            # For other encodings, do a quick check if it has the same byte representation for us-ascii characters
+            try:
+                if 'test'.encode('us-ascii') != 'test'.encode(m.group(2)):
+                    raise UnicodeError('XML document is using \'{}\' encoding which is not compatible with \'US-ASCII\' encoding.'.format(m.group(2)))
+            except LookupError:
+                raise UnicodeError('XML document is using unknown \'{}\' encoding.'.format(m.group(2)))
+
+    m = re_invalid_ascii_bytes.search(data)
+    if m:
+        # Line and column are only computed for the offending byte. Line breaks are \n, \r\n or a single \r as in text mode.
+        pos = m.start(0)
+        byte = data[pos]
+        if byte >= 0x80:
+            raise UnicodeError('\'ascii\' codec can\'t decode byte 0x{:02x} in position {}: ordinal not in range(128)'.format(byte,pos))
+        prefix = bytes(data[:pos])
+        line = prefix.count(b'\n') + prefix.count(b'\r') - prefix.count(b'\r\n')
+        column = pos - max(prefix.rfind(b'\n'),prefix.rfind(b'\r')) - 1
+        raise UnicodeError('Invalid ASCII character \'{0}\' found on line {1} column {2}.'.format('\\x%d'%byte,line+1,column+1))
 
-def check_valid_html(elem, catalog, baseuri, errors, table=None):
+def check_valid_ascii(uri, catalog, error_log):
+    # 5.2.1.1 Valid ASCII Characters
+    try:
+        with open_bytes(uri, catalog) as data:
+            check_ascii_bytes(data)
+    except UnicodeError as e:
+        hint = xbrl.Error.create('{exception}', exception=xbrl.Error.Param(str(e),quotes=False))
+        error_log.report(xbrl.Error.create('[EFM.5.2.1.1] File {uri} is not a valid ASCII dcoument.', uri=uri, children=[hint]))                    
+
+# Maximum number of entries of the process-wide caches of image types and valid HTML fragments. A cache is cleared when it is full.
+process_cache_limit = 10000
+
+# Process-wide cache of the valid image types determined by probe_image keyed by the resolved uri and the modification time and size of the local file or zip archive
+_image_types = {}
+_image_types_lock = threading.Lock()
+
+def probe_image(imageuri, catalog, job_image_types=None):
+    """Returns the image type as determined by imghdr from the header of the image, an empty string if the type is not known or None if the image cannot be opened. Valid GIF and JPEG images of local files and zip archives are cached for the lifetime of the process, all other results only in the job_image_types dict if given."""
+    resolved_uri = catalog.resolve_uri(imageuri)
+    stamp = cache_files.uri_stamp(resolved_uri)
+    key = (resolved_uri,stamp)
+    with _image_types_lock:
+        if key in _image_types:
+            return _image_types[key]
+    if job_image_types is not None and resolved_uri in job_image_types:
+        return job_image_types[resolved_uri]
+    try:
+        # The GIF and JPEG signatures are within the first few bytes
+        with altova.open(imageuri,catalog=catalog,mode='rb') as f:
+            image_type = imghdr.what(None,f.read(32)) or ''
+    except OSError:
+        image_type = None
+    if stamp is not None and image_type in ('gif','jpeg'):
+        with _image_types_lock:
+            if len(_image_types) >= process_cache_limit:
+                _image_types.clear()
+            _image_types[key] = image_type
+    elif job_image_types is not None:
+        job_image_types[resolved_uri] = image_type
+    return image_type
+
+def check_valid_html(elem, catalog, baseuri, errors, table=None, image_types=None):
     if elem.local_name == 'a':
         href = elem.find_attribute('href')
         if href and not re_html_href.fullmatch(href.normalized_value):
@@ -312,12 +389,11 @@ def check_valid_html(elem, catalog, baseuri, errors, table=None):
         if src and not re_html_src.fullmatch(src.normalized_value):
             errors.append(xbrl.Error.create('[EFM.5.2.2.3] Reference to {src:value} is not allowed in attribute {src} in element {img}.', location='src:value', src=src, img=elem))
         else:
-            try:
-                imageuri = urljoin(baseuri,src.normalized_value)
-                if imghdr.what(imageuri,altova.open(imageuri,catalog=catalog,mode='rb').read()) not in ('gif','jpeg'):
-                    errors.append(xbrl.Error.create('[EFM.5.2.2.3] Image {src:value} referenced in attribute {src} in element {img} is not a valid GIF or JPEG image.', location='src:value', src=src, img=elem))
-            except OSError:
+            image_type = probe_image(urljoin(baseuri,src.normalized_value),catalog,image_types)
+            if image_type is None:
                 errors.append(xbrl.Error.create('[EFM.5.2.2.3] Image {src:value} referenced in attribute {src} in element {img} cannot be opened.', location='src:value', src=src, img=elem))
+            elif image_type not in ('gif','jpeg'):
+                errors.append(xbrl.Error.create('[EFM.5.2.2.3] Image {src:value} referenced in attribute {src} in element {img} is not a valid GIF or JPEG image.', location='src:value', src=src, img=elem))
     elif elem.local_name == 'table':
         if table is not None:
             errors.append(xbrl.Error.create('[EFM.5.2.2.3] Element {table} cannot be nested with another table element {table2}.', location='table', table=elem, table2=table))
@@ -325,47 +401,179 @@ def check_valid_html(elem, catalog, baseuri, errors, table=None):
             table = elem
 
     for child in elem.element_children():
-        check_valid_html(child, catalog, baseuri, errors, table)
+        check_valid_html(child, catalog, baseuri, errors, table, image_types)
                     
-def find_directed_cycle(network, node, path, visited, cycle):
-    if node in path:
-        return True
-    path.add(node)
-    visited.append(node)
-    for rel in network.relationships_from(node):
-        if find_directed_cycle(network,rel.target,path,visited,cycle):
-            cycle.append(rel)
-            return True
-    path.remove(node)
-    return False
-
-def detect_directed_cycles(network):
-    roots = set([rel.source for rel in network.relationships])
-    while len(roots):
-        cycle = []
-        visited = []
-        if find_directed_cycle(network,roots.pop(),set(),visited,cycle):
-            return cycle
-        for node in visited:
-            roots.discard(node)
-    return []
-
-def has_undirected_drs_cycles(drs, rel, visited):
-    if rel.target in visited:
-        return True
-    visited.add(rel.target)
-    for nextrel in drs.consecutive_relationships(rel):
-        if has_undirected_drs_cycles(drs,nextrel,visited):
-            return True
-    return False
-
-def has_concepts_in_presentation_linkbase(dts, concept1, concept2):
+# Result of the validation of an HTML fragment. errors holds the errors of the validation against the edbody DTD and of check_valid_html. well_formedness_errors is None if the fragment is well-formed XML, otherwise it holds the errors of parsing it without DTD.
+HtmlResult = collections.namedtuple('HtmlResult',['errors','well_formedness_errors'])
+valid_html = HtmlResult([],None)
+
+# Process-wide ordered sets (dicts with None values, oldest first) of the content hashes of valid HTML fragments without images keyed by the htmlCache file from which they have been loaded
+_valid_html_hashes = {}
+_valid_html_hashes_lock = threading.Lock()
+
+def valid_html_hashes(path):
+    """Returns the process-wide ordered set of content hashes of valid HTML fragments for the given cache file. The file is only read once per process and only its newest process_cache_limit hashes are kept."""
+    with _valid_html_hashes_lock:
+        hashes = _valid_html_hashes.get(path)
+        if hashes is None:
+            try:
+                with open(path) as f:
+                    lines = [line.strip() for line in f if line.strip()]
+            except OSError:
+                lines = []
+            hashes = dict.fromkeys(lines[-process_cache_limit:])
+            _valid_html_hashes[path] = hashes
+        return hashes
+
+class HtmlValidator(object):
+    """Validates HTML fragments of text blocks and footnotes against the edbody DTD and check_valid_html. Results are memoized by content hash, so that identical fragments are parsed only once. If cache_file is given, the hashes of valid fragments without images are shared by all validators using the same file and are saved to it."""
+
+    def __init__(self,edbody_dtd,uri_edbody_dtd,catalog,baseuri,cache_file=None):
+        self.edbody_dtd = edbody_dtd
+        # The hashes depend on the version of this script and the DTD, so that changes of the checks or the DTD invalidate the persisted hashes
+        self.key_prefix = '%s|%s|%r' % (__version__,uri_edbody_dtd,cache_files.uri_stamp(catalog.resolve_uri(uri_edbody_dtd)))
+        self.catalog = catalog
+        self.baseuri = baseuri
+        self.cache_file = cache_file
+        self.results = {}
+        self.new_valid_hashes = []
+        self.valid_hashes = valid_html_hashes(cache_file) if cache_file else {}
+        self.image_types = {}
+        self.lock = threading.Lock()
+
+    def key(self,html):
+        """Returns the content hash of the fragment."""
+        return hashlib.sha1('\0'.join((self.key_prefix,html)).encode()).hexdigest()
+
+    def _validate(self,html):
+        content = html.encode()
+        (xsi,log) = xml.Instance.create_from_buffer(content,dtd=self.edbody_dtd,catalog=self.catalog)
+        errors = list(log.errors)
+        if xsi:
+            check_valid_html(xsi.document_element, self.catalog, self.baseuri, errors, image_types=self.image_types)
+            return HtmlResult(errors,None)
+        # Only fragments which could not be loaded with the DTD are parsed a second time to tell well-formedness errors apart from DTD errors
+        (xsi2,log2) = xml.Instance.create_from_buffer(content)
+        return HtmlResult(errors,None if xsi2 else list(log2.errors))
+
+    def validate(self,html,key=None):
+        """Returns the HtmlResult of the given fragment."""
+        if key is None:
+            key = self.key(html)
+        with self.lock:
+            result = self.results.get(key)
+        if result is None:
+            if key in self.valid_hashes:
+                result = valid_html
+            else:
+                result = self._validate(html)
+                # Images may change between filings, so only fragments without images are remembered as valid
+                if not result.errors and not re_html_img.search(html):
+                    with _valid_html_hashes_lock:
+                        # The oldest hash is evicted, so that the cache keeps working once it is full
+                        if len(self.valid_hashes) >= process_cache_limit:
+                            del self.valid_hashes[next(iter(self.valid_hashes))]
+                        self.valid_hashes[key] = None
+                    if self.cache_file:
+                        with self.lock:
+                            self.new_valid_hashes.append(key)
+            with self.lock:
+                self.results[key] = result
+        return result
+
+    def validate_all(self,fragments,max_workers=1):
+        """Validates all unique fragments of the given (id, html) tuples which have not been validated yet, concurrently on a thread pool if max_workers > 1. Returns a dict mapping the ids to the content hashes, which can be passed to validate."""
+        keys = {}
+        unique = {}
+        for index, html in fragments:
+            key = keys[index] = self.key(html)
+            if key not in self.results:
+                unique.setdefault(key,html)
+        if max_workers > 1 and len(unique) > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers,len(unique))) as executor:
+                for future in [executor.submit(self.validate,html,key) for key, html in unique.items()]:
+                    future.result()
+        else:
+            for key, html in unique.items():
+                self.validate(html,key)
+        return keys
+
+    def save(self):
+        """Rewrites the cache file with the bounded set of hashes of valid fragments if this validator found new valid fragments."""
+        if self.cache_file and self.new_valid_hashes:
+            with _valid_html_hashes_lock:
+                data = ''.join(key+'\n' for key in self.valid_hashes)
+            cache_files.write_atomic(self.cache_file,lambda f: f.write(data))
+            self.new_valid_hashes = []
+
+def textblock_html(instance,textBlockItemTypes):
+    """Yields an (index, html) tuple with the position in instance.facts and the HTML body fragment of each text block fact which contains markup."""
+    for index, fact in enumerate(instance.facts):
+        if isinstance(fact,xbrl.Item) and not fact.xsi_nil and fact.concept.type_definition in textBlockItemTypes:
+            if re_html_stag.search(fact.normalized_value):
+                yield (index,''.join(('<body>',fact.normalized_value,'</body>')))
+
+class DrsCycleDetector(object):
+    """Detects undirected cycles in the dimension-domain and domain-member relationships of a DRS with union-find. The consecutive relationships are computed once per arcrole, target and link role and shared by all dimensions and primary items."""
+
+    def __init__(self,drs):
+        self.drs = drs
+        self.consecutive = {}
+
+    def consecutive_relationships(self,rel):
+        """Returns the list of relationships consecutive to the given dimension-domain or domain-member relationship."""
+        key = (rel.arcrole,rel.target,rel.arc.target_role or rel.role)
+        rels = self.consecutive.get(key)
+        if rels is None:
+            rels = list(self.drs.consecutive_relationships(rel))
+            self.consecutive[key] = rels
+        return rels
+
+    def find_cycle(self,rels):
+        """Returns the first of the given relationships from the same root whose domain-member network closes an undirected cycle or None if there is no cycle."""
+        parents = {}
+        def find(node):
+            path = []
+            while node in parents:
+                path.append(node)
+                node = parents[node]
+            for child in path:
+                parents[child] = node
+            return node
+
+        for rel in rels:
+            stack = [rel]
+            while stack:
+                rel2 = stack.pop()
+                source = find(rel2.source)
+                target = find(rel2.target)
+                if source == target:
+                    return rel
+                parents[target] = source
+                stack.extend(self.consecutive_relationships(rel2))
+        return None
+
+def presentation_role_index(dts):
+    """Returns a list of (link role, base set, network) tuples for all presentation link roles and a dict with the indexes into this list of the networks in which each concept is the source or target of an effective presentation relationship."""
+    networks = []
+    concept_networks = {}
     for link_role in dts.presentation_link_roles():
-        network = dts.presentation_base_set(link_role).network_of_relationships()
-        if len(list(network.relationships_from(concept1))) or len(list(network.relationships_to(concept1))):
-            if len(list(network.relationships_from(concept2))) or len(list(network.relationships_to(concept2))):
-                return True
-    return False
+        baseset = dts.presentation_base_set(link_role)
+        network = baseset.network_of_relationships()
+        index = len(networks)
+        networks.append((link_role,baseset,network))
+        for rel in network.relationships:
+            for concept in (rel.source,rel.target):
+                indexes = concept_networks.setdefault(concept,[])
+                if not indexes or indexes[-1] != index:
+                    indexes.append(index)
+    return networks, concept_networks
+
+def has_concepts_in_presentation_linkbase(concept_networks, concept1, concept2):
+    """Returns True if both concepts participate in effective presentation relationships of the same link role."""
+    networks1 = concept_networks.get(concept1)
+    networks2 = concept_networks.get(concept2)
+    return bool(networks1 and networks2) and not set(networks1).isdisjoint(networks2)
     
 def parse_edgar_taxonomies(uri_edgar_taxonomies,catalog,error_log):
     (edgar_taxonomies, log) = xml.Instance.create_from_url(uri_edgar_taxonomies,catalog=catalog)
@@ -382,6 +590,54 @@ def parse_edgar_taxonomies(uri_edgar_taxonomies,catalog,error_log):
         taxonomies.append(entry)
     return version, taxonomies
 
+class StandardTaxonomyIndex(object):
+    """Immutable index of the standard taxonomies listed in edgartaxonomies.xml. The mapping of the catalog resolved uris to the standard uris is computed once per catalog."""
+
+    def __init__(self,version,taxonomies):
+        self.version = version
+        self.taxonomies = tuple(types.MappingProxyType(entry) for entry in taxonomies)
+        self.uris = frozenset(entry['Href'] for entry in taxonomies)
+        self.namespaces = types.MappingProxyType({entry['Namespace']: entry['Href'] for entry in taxonomies if entry['AttType'] == 'SCH'})
+        self.authorities = frozenset(re_authority.match(entry['Namespace']).group(1) for entry in taxonomies if entry['AttType'] == 'SCH')
+        self._mapped_uris = []
+        self._lock = threading.Lock()
+
+    def is_valid_href(self,href):
+        """Returns True if href refers to a standard taxonomy uri or a relative file name, optionally followed by a shorthand pointer fragment."""
+        base, sep, fragment = href.partition('#')
+        if sep and not re_href_fragment.fullmatch(fragment):
+            return False
+        return base in self.uris or re_relative_href.fullmatch(base) is not None
+
+    def mapped_uris(self,catalog):
+        """Returns a read-only dict of the standard uris keyed by their uri resolved with the given catalog."""
+        with self._lock:
+            for cached_catalog, mapped_uris in self._mapped_uris:
+                if cached_catalog is catalog:
+                    return mapped_uris
+            mapped_uris = types.MappingProxyType({catalog.resolve_uri(uri):uri for uri in self.uris})
+            # Only the most recently used catalogs are kept, as each job may come with its own catalog object
+            self._mapped_uris = [(catalog,mapped_uris)]+self._mapped_uris[:7]
+            return mapped_uris
+
+_standard_taxonomy_indexes = {}
+_standard_taxonomy_indexes_lock = threading.Lock()
+
+def load_standard_taxonomies(uri_edgar_taxonomies,catalog,error_log):
+    """Returns the StandardTaxonomyIndex of the given edgartaxonomies.xml. The index is cached for the lifetime of the process and only rebuilt if the file changes. Remote files are parsed only once per process."""
+    resolved_uri = catalog.resolve_uri(uri_edgar_taxonomies)
+    key = (resolved_uri,cache_files.uri_stamp(resolved_uri))
+    with _standard_taxonomy_indexes_lock:
+        index = _standard_taxonomy_indexes.get(key)
+    if index is None:
+        version, taxonomies = parse_edgar_taxonomies(uri_edgar_taxonomies,catalog,error_log)
+        index = StandardTaxonomyIndex(version,taxonomies)
+        # Failures are not cached, so that the error is reported by each job
+        if version is not None:
+            with _standard_taxonomy_indexes_lock:
+                _standard_taxonomy_indexes[key] = index
+    return index
+
 def parse_edbody_dtd(uri_edbody_dtd,catalog,error_log):
     (edbody_dtd,log) = xml.dtd.DTD.create_from_url(uri_edbody_dtd,catalog=catalog)
     if not edbody_dtd:
@@ -412,6 +668,7 @@ def validate_contexts(instance, error_log, CIK, contextrefs, used_concepts):
     cikValue = None
     unique_contexts = {}
     required_contexts = set()
+    member_references = {}
     for context in instance.contexts:   
         identifier = context.entity.identifier
         
@@ -442,6 +699,7 @@ def validate_contexts(instance, error_log, CIK, contextrefs, used_concepts):
                 error_log.report(xbrl.Error.create('[EFM.6.5.5] Element {elem} is not allowed in segment of context {context}.', location=child, elem=child, context=context))
             for member in context.entity.segment.explicit_members:
                 used_concepts.setdefault(member.value,False)
+                member_references.setdefault(member.value,(context,member))
         
         # 6.5.7 An instance must not contain duplicate xbrli:context elements.
         cs = xbrl.ConstraintSet(context)
@@ -471,31 +729,25 @@ def validate_contexts(instance, error_log, CIK, contextrefs, used_concepts):
             # 6.5.38 Do not use element xbrli:forever in contexts.
             error_log.report(xbrl.Error.create('[EFM.6.5.38] Element {forever} is not allowed within a period.', forever=period.forever))
     
-    return cikValue, required_contexts
-
-def decimal_comparison(fact1,fact2,cmp):
-    """Rounds both numerical facts to the least accurate precision of both facts and calls the given cmp function with the rounded decimal values."""
-    decimals = min(fact1.decimals,fact2.decimals)
-    if decimals == float('inf'):
-        return cmp(fact1.numeric_value,fact2.numeric_value)
-    val1 = fact1.numeric_value.scaleb(decimals).quantize(1,decimal.ROUND_HALF_EVEN).scaleb(-decimals)
-    val2 = fact2.numeric_value.scaleb(decimals).quantize(1,decimal.ROUND_HALF_EVEN).scaleb(-decimals)   
-    return cmp(val1,val2,decimals)
-    
+    return cikValue, required_contexts, member_references
+
 def v_equals(fact,fact2):
     if not fact.xsi_nil and fact.concept.is_numeric():
-        return decimal_comparison(fact,fact2,lambda x,y,d=None:x==y)
+        return xbrl_decimals.compare(fact.numeric_value,fact.decimals,fact2.numeric_value,fact2.decimals,xbrl_decimals.equal)
     return fact.normalized_value == fact2.normalized_value
 
-def validate_facts(instance,error_log,catalog,domainItemTypes,textBlockItemTypes,edbody_dtd):
+def validate_facts(instance,error_log,catalog,domainItemTypes,textblock_keys,html_validator):
     unique_facts = {}
     contextrefs = set()
     used_concepts = {}
-    for fact in instance.facts:
+    unitrefs = {}
+    for index, fact in enumerate(instance.facts):
         if not used_concepts.setdefault(fact.concept,not fact.xsi_nil) and not fact.xsi_nil:
             used_concepts[fact.concept] = True
         if isinstance(fact,xbrl.Item):
             contextrefs.add(fact.contextRef)
+            if fact.unitRef is not None:
+                unitrefs.setdefault(fact.concept,set()).add(fact.unitRef)
         
             # 6.5.12 An instance must not have more than one fact having the same element name, equal contextRef attributes, and if they are present, equal unitRef attributes and xml:lang attributes, respectively, unless their fact values are the same.
             key = (fact.qname,fact.contextRef,fact.unitRef,'en-US' if fact.xml_lang is None else fact.xml_lang)
@@ -506,19 +758,15 @@ def validate_facts(instance,error_log,catalog,domainItemTypes,textBlockItemTypes
             
             # 6.5.15 If the un-escaped content of a fact with base type us-types:textBlockItemType or a type equal to or derived by restriction of the type 'escapedItemType' in a standard taxonomy schema namespace contains the '<' character followed by a QName and whitespace, '/>' or '>', then the un-escaped content must contain only a sequence of text and XML nodes.
             # 6.5.16 Facts of type 'text block' whose un-escaped content contains markup must satisfy the content model of the BODY tag as defined in 5.2.2.
-            if not fact.xsi_nil and fact.concept.type_definition in textBlockItemTypes:
-                if re_html_stag.search(fact.normalized_value):
-                    html = ''.join(('<body>',fact.normalized_value,'</body>'))
-                    (xsi,log) = xml.Instance.create_from_buffer(html.encode(),dtd=edbody_dtd,catalog=catalog)
-                    errors = list(log.errors)
-                    if xsi:
-                        check_valid_html(xsi.document_element, catalog, instance.uri, errors)
-                    if errors:
-                        (xsi2,log2) = xml.Instance.create_from_buffer(html.encode())
-                        if not xsi2:
-                            error_log.report(xbrl.Error.create('[EFM.6.5.15] The un-escaped content of textBlockItem {fact} must be XML well-formed.', fact=fact, children=list(log2.errors)))
-                        else:
-                            error_log.report(xbrl.Error.create('[EFM.6.5.16] The un-escaped content of textBlockItem {fact} must satisfy the content model of the HTML BODY tag.', fact=fact, children=errors))
+            # textblock_keys holds the content hashes of the text blocks with markup, so that their results are looked up without hashing them again
+            key = textblock_keys.get(index)
+            if key is not None:
+                result = html_validator.validate(''.join(('<body>',fact.normalized_value,'</body>')),key)
+                if result.errors:
+                    if result.well_formedness_errors is not None:
+                        error_log.report(xbrl.Error.create('[EFM.6.5.15] The un-escaped content of textBlockItem {fact} must be XML well-formed.', fact=fact, children=result.well_formedness_errors))
+                    else:
+                        error_log.report(xbrl.Error.create('[EFM.6.5.16] The un-escaped content of textBlockItem {fact} must satisfy the content model of the HTML BODY tag.', fact=fact, children=result.errors))
 
             # 6.5.17 The xbrli:xbrl element must not have any facts with the precision attribute.
             if fact.precision is not None:
@@ -542,7 +790,7 @@ def validate_facts(instance,error_log,catalog,domainItemTypes,textBlockItemTypes
                 fact = unique_facts[key]
                 error_log.report(xbrl.Error.create('[EFM.6.5.14] Fact {fact} does not have a corresponding en-US fact.', location=fact.element, fact=fact))
 
-    return contextrefs, used_concepts
+    return contextrefs, used_concepts, unitrefs
     
 def validate_required_facts(instance,error_log,dei_taxonomy,gaap_taxonomy,required_contexts,cikValue,cikNames,submissionType):
     dei_namespace = dei_taxonomy.target_namespace
@@ -727,8 +975,19 @@ def validate_labels(instance, error_log):
     #           if label.xlink_role in numeric_roles:
     #               error_log.report(xbrl.Error.create('[EFM.6.10.9] Non-numeric concept {concept} must not be linked to a label resource with numeric role {role:value}.', location=concept, concept=concept, role=xbrl.Error.Param(label.xlink_role,location=label.element.find_attribute(('role',xlink_namespace)))))
                 
-def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catalog()):
-
+def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catalog(), profiler=None):
+    """Performs the EFM checks and, if enabled, the DQC rules. Returns the profiler. If profiler is not given, a validation_profiler.Profiler is used when enabled by the profile script parameter and its memory tracing is stopped before returning."""
+    if profiler is not None:
+        _validate(uri, instance, error_log, params, catalog, profiler)
+        return profiler
+    profiler = validation_profiler.Profiler() if validation_profiler.is_enabled(params) else validation_profiler.disabled
+    try:
+        _validate(uri, instance, error_log, params, catalog, profiler)
+    finally:
+        profiler.close()
+    return profiler
+
+def _validate(uri, instance, error_log, params, catalog, profiler):
     # instance object will be None if XBRL 2.1 validation was not successful
     if instance is None:
         # 6.4.3 The XBRL instance documents in a submission must be XBRL 2.1 valid.
@@ -753,12 +1012,13 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
     uri_edgar_taxonomies = params.get('edgar-taxonomies-url',urljoin('file:',pathname2url(os.path.join(os.path.dirname(__file__),'edgartaxonomies.xml'))))
     uri_edbody_dtd = params.get('edbody-url',urljoin('file:',pathname2url(os.path.join(os.path.dirname(__file__),'edbody.dtd'))))
 
-    edgar_version, standard_taxonomies = parse_edgar_taxonomies(uri_edgar_taxonomies,catalog,error_log)
-    standard_uris = {entry['Href'] for entry in standard_taxonomies}
-    standard_namespaces = dict([(entry['Namespace'],entry['Href']) for entry in standard_taxonomies if entry['AttType'] == 'SCH'])
-    standard_authorities = {re_authority.match(entry['Namespace']).group(1) for entry in standard_taxonomies if entry['AttType'] == 'SCH'}
-    standard_mapped_uris = {catalog.resolve_uri(uri):uri for uri in standard_uris}
-    re_href = re.compile('('+'|'.join(list(map('({0})'.format,standard_uris)))+'|([^/:#]*))(#[a-zA-Z_][a-zA-Z0-9_.-]*)?')
+    standard_taxonomies = load_standard_taxonomies(uri_edgar_taxonomies,catalog,error_log)
+    edgar_version = standard_taxonomies.version
+    standard_uris = standard_taxonomies.uris
+    standard_namespaces = standard_taxonomies.namespaces
+    standard_authorities = standard_taxonomies.authorities
+    standard_mapped_uris = standard_taxonomies.mapped_uris(catalog)
+    is_valid_href = standard_taxonomies.is_valid_href
 
     dei_taxonomy = None
     gaap_taxonomy = None
@@ -790,6 +1050,7 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
         error_log.report(xbrl.Error.create('Instance {xbrl} does not appear to be a SEC filing.', xbrl=instance.document_element))
         return
         
+    stage = profiler.begin('EFM','6.3',error_log)
     # 5.2.1.1 Valid ASCII Characters
     check_valid_ascii(instance.uri, catalog, error_log)
     
@@ -801,33 +1062,36 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
     for schema_location in instance.schema_location_attributes:
         if schema_location.local_name == 'schemaLocation':
             for uri in schema_location.normalized_value.split()[1::2]:
-                if not re_href.fullmatch(uri):
+                if not is_valid_href(uri):
                     error_log.report(xbrl.Error.create('[EFM.6.3.6] {uri} in attribute {schemaLocation} on {xbrl} must be a standard schema or a relative filename optionally followed by a shorthard xpointer.', location='uri', uri=xml.Error.Param(uri,location=schema_location), schemaLocation=schema_location, xbrl=instance.document_element))
     for schemaref in instance.schema_refs:
-        if not re_href.fullmatch(schemaref.xlink_href):
+        if not is_valid_href(schemaref.xlink_href):
             href = schemaref.element.find_attribute(('href',xlink_namespace))
             error_log.report(xbrl.Error.create('[EFM.6.3.6] {href:value} in attribute {href} on {schemaRef} must be a standard schema or a relative filename optionally followed by a shorthard xpointer.', location='href:value', href=href, schemaRef=schemaref))
     for linkbaseref in instance.linkbase_refs:
-        if not re_href.fullmatch(linkbaseref.xlink_href):
+        if not is_valid_href(linkbaseref.xlink_href):
             href = linkbaseref.element.find_attribute(('href',xlink_namespace))
             error_log.report(xbrl.Error.create('[EFM.6.3.6] {href:value} in attribute {href} on {linkbaseRef} must be a standard schema or a relative filename optionally followed by a shorthard xpointer.', location='href:value', href=href, linkbaseRef=linkbaseref))
     for roleref in instance.role_refs:
-        if not re_href.fullmatch(roleref.xlink_href):
+        if not is_valid_href(roleref.xlink_href):
             href = roleref.element.find_attribute(('href',xlink_namespace))
             error_log.report(xbrl.Error.create('[EFM.6.3.6] {href:value} in attribute {href} on {roleRef} must be a standard schema or a relative filename optionally followed by a shorthard xpointer.', location='href:value', href=href, roleRef=roleref))
     for arcroleref in instance.arcrole_refs:
-        if not re_href.fullmatch(arcroleref.xlink_href):
+        if not is_valid_href(arcroleref.xlink_href):
             href = arcroleref.element.find_attribute(('href',xlink_namespace))
             error_log.report(xbrl.Error.create('[EFM.6.3.6] {href:value} in attribute {href} on {arcroleRef} must be a standard schema or a relative filename optionally followed by a shorthard xpointer.', location='href:value', href=href, arcroleRef=arcroleref))
     for footnote_link in instance.footnote_links:
         for loc in footnote_link.locators:
-            if not re_href.fullmatch(loc.xlink_href):
+            if not is_valid_href(loc.xlink_href):
                 href = loc.element.find_attribute(('href',xlink_namespace))
                 error_log.report(xbrl.Error.create('[EFM.6.3.6] {href:value} in attribute {href} on {loc} must be a standard schema or a relative filename optionally followed by a shorthard xpointer.', location='href:value', href=href, loc=loc))
     
     # 6.3.11 Attribute xml:base must not appear in any Interactive Data document.
     check_xml_base(instance.document_element, error_log)
 
+    profiler.end(stage)
+
+    stage = profiler.begin('EFM','6.7',error_log)
     base_to_derived_types = calc_base_to_derived_types(instance.dts.schema)
 
     domainItemTypes = set()
@@ -868,11 +1132,11 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
         
             # 6.3.6 The URI content of the xlink:href attribute, the xsi:schemaLocation attribute and the schemaLocation attribute must be relative and contain no forward slashes, or a recognized external location of a standard taxonomy schema file, or a '#' followed by a shorthand xpointer.
             for ref in schema.references:
-                if not re_href.fullmatch(ref.schema_location):
+                if not is_valid_href(ref.schema_location):
                     schemalocation = ref.element.find_attribute('schemaLocation')
                     error_log.report(xbrl.Error.create('[EFM.6.3.6] {schemaLocation:value} in attribute {schemaLocation} on {ref} must be a standard schema or a relative filename optionally followed by a shorthard xpointer.', location='schemaLocation:value', schemaLocation=schemalocation, ref=ref))
             for linkbaseref in schema.linkbase_refs:
-                if not re_href.fullmatch(linkbaseref.xlink_href):
+                if not is_valid_href(linkbaseref.xlink_href):
                     href = linkbaseref.element.find_attribute(('href',xlink_namespace))
                     error_log.report(xbrl.Error.create('[EFM.6.3.6] {href:value} in attribute {href} on {linkbaseRef} must be a standard schema or a relative filename optionally followed by a shorthard xpointer.', location='href:value', href=href, linkbaseRef=linkbaseref))
         
@@ -1114,9 +1378,18 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
         else:
             role_types[role_type.role_uri] = role_type
     
+    profiler.end(stage)
+
     edbody_dtd = parse_edbody_dtd(uri_edbody_dtd,catalog,error_log)
-    
-    contextrefs, used_concepts = validate_facts(instance,error_log,catalog,domainItemTypes,textBlockItemTypes,edbody_dtd)
+    html_validator = HtmlValidator(edbody_dtd,uri_edbody_dtd,catalog,instance.uri,params.get('htmlCache'))
+
+    # 6.5.15 and 6.5.16 The HTML of all unique text blocks is validated upfront, so that validate_facts only looks up the results
+    stage = profiler.begin('EFM','6.5.16',error_log,lambda: len(html_validator.results))
+    textblock_keys = html_validator.validate_all(textblock_html(instance,textBlockItemTypes),max(int(params.get('htmlWorkers','1')),1))
+    profiler.end(stage)
+
+    stage = profiler.begin('EFM','6.5',error_log,lambda: len(instance.facts))
+    contextrefs, used_concepts, unitrefs = validate_facts(instance,error_log,catalog,domainItemTypes,textblock_keys,html_validator)
 
     for link in instance.footnote_links:
         to_labels = set()
@@ -1147,13 +1420,9 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
                         error_log.report(xbrl.Error.create('[EFM.6.5.28] Role {role:value} on footnote {footnote} must be defined in the XBRL 2.1 specification.', location='role:value', role=role_attr, footnote=elem))
 
                     # 6.5.34 The content of a link:footnote element must satisfy the content model of the BODY tag as defined in 5.2.2.
-                    html = ''.join(('<body>',elem.serialize(omit_start_tag=True),'</body>'))
-                    (xsi,log) = xml.Instance.create_from_buffer(html.encode(),dtd=edbody_dtd,catalog=catalog)
-                    errors = list(log.errors)
-                    if xsi:
-                        check_valid_html(xsi.document_element, catalog, instance.uri, errors)
-                    if errors:
-                        error_log.report(xbrl.Error.create('[EFM.6.5.34] The content of footnote {footnote} must satisfy the content model of the HTML BODY tag.', footnote=elem, children=errors))
+                    result = html_validator.validate(''.join(('<body>',elem.serialize(omit_start_tag=True),'</body>')))
+                    if result.errors:
+                        error_log.report(xbrl.Error.create('[EFM.6.5.34] The content of footnote {footnote} must satisfy the content model of the HTML BODY tag.', footnote=elem, children=result.errors))
                         
                 elif elem.local_name == 'footnoteArc':
                     to_labels.add(elem.find_attribute(('to',xlink_namespace)).normalized_value)
@@ -1177,14 +1446,19 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
             if label_attr.normalized_value not in to_labels:
                 error_log.report(xbrl.Error.create('[EFM.6.5.33] Non-empty footnote {footnote} must be linked to at least one fact.', location=elem, footnote=elem))
 
-    cikValue, required_contexts = validate_contexts(instance,error_log,CIK,contextrefs,used_concepts)
+    cikValue, required_contexts, member_references = validate_contexts(instance,error_log,CIK,contextrefs,used_concepts)
     validate_units(instance,error_log)
 
     validate_required_facts(instance,error_log,dei_taxonomy,gaap_taxonomy,required_contexts,cikValue,cikNames,submissionType)
+    html_validator.save()
+
+    profiler.end(stage)
 
+    stage = profiler.begin('EFM','6.16',error_log)
     positive_axes = set()
     negative_axis_rels = []
     drs = instance.dts.dimensional_relationship_set()   
+    drs_cycles = DrsCycleDetector(drs)
     for baseset in instance.dts.base_sets:
         # 6.9.3 A link:linkbase in a submission must have no ineffectual relationships.
         for rel in baseset.relationships:
@@ -1214,8 +1488,7 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
                                 
         if baseset.arcrole == 'http://www.xbrl.org/2003/arcrole/summation-item':
             # 6.14.4 There must be no directed cycles in effective relationships having arc role http://www.xbrl.org/2003/role/summation-item.
-            cycle = detect_directed_cycles(baseset.network_of_relationships())
-            if len(cycle):
+            for cycle in network_graph.directed_cycles(network_graph.from_network(baseset.network_of_relationships())):
                 hints = [xbrl.Error.create('Relationship {arc} from {source} to {target}', severity=xml.ErrorSeverity.INFO, arc=rel.arc, source=rel.source, target=rel.target) for rel in cycle]
                 error_log.report(xbrl.Error.create('[EFM.6.14.4] There must be no directed cycles in effective relationships having arc role http://www.xbrl.org/2003/role/summation-item.', location=cycle[0].arc, children=hints))
 
@@ -1263,11 +1536,9 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
 
             # 6.16.4 The xlink:arcrole attributes 'http://xbrl.org/int/dim/arcrole/domain-member' and 'http://xbrl.org/int/dim/arcrole/dimension-domain' must have no undirected cycles in any Directed Relationship Set as defined in XBRL Dimensions 1.0.
             for dim in network.roots:
-                visited = set()
-                for rel in network.relationships_from(dim):
-                    if has_undirected_drs_cycles(drs,rel,visited):
-                        error_log.report(xbrl.Error.create('[EFM.6.16.4] DRS must not have undirected cycles in domain member network starting from relationship {arc}.', location=rel.arc, arc=rel.arc))
-                        break
+                rel = drs_cycles.find_cycle(network.relationships_from(dim))
+                if rel is not None:
+                    error_log.report(xbrl.Error.create('[EFM.6.16.4] DRS must not have undirected cycles in domain member network starting from relationship {arc}.', location=rel.arc, arc=rel.arc))
 
         elif baseset.arcrole == 'http://xbrl.org/int/dim/arcrole/dimension-default':
             # 6.16.3 The target of an effective relationship with an xlink:arcrole attribute equal to 'http://xbrl.org/int/dim/arcrole/dimension-domain' or 'http://xbrl.org/int/dim/arcrole/dimension-default' must be a domain member.
@@ -1281,11 +1552,9 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
             # 6.16.4 The xlink:arcrole attributes 'http://xbrl.org/int/dim/arcrole/domain-member' and 'http://xbrl.org/int/dim/arcrole/dimension-domain' must have no undirected cycles in any Directed Relationship Set as defined in XBRL Dimensions 1.0.
             for primary_item in network.roots:
                 if primary_item.type_definition not in domainItemTypes:
-                    visited = set()
-                    for rel in network.relationships_from(primary_item):
-                        if has_undirected_drs_cycles(drs,rel,visited):
-                            error_log.report(xbrl.Error.create('[EFM.6.16.4] DRS must not have undirected cycles in domain member network starting from relationship {arc}.', location=rel.arc, arc=rel.arc))
-                            break
+                    rel = drs_cycles.find_cycle(network.relationships_from(primary_item))
+                    if rel is not None:
+                        error_log.report(xbrl.Error.create('[EFM.6.16.4] DRS must not have undirected cycles in domain member network starting from relationship {arc}.', location=rel.arc, arc=rel.arc))
 
         if baseset.extended_link_qname == qname_definitionLink:
             # 6.16.9 If the value of attribute xbrldt:targetRole on an effective definition relationship is not empty, then that relationship must have at least one effective consecutive relationship (as defined by the XBRL Dimensions specification).
@@ -1300,6 +1569,9 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
         if not (rel.role,rel2.target) in positive_axes:
             error_log.report(xbrl.Error.create('[EFM.6.16.7] Axis {axis} of negative table {table} must appear in a positive table.', location=rel.arc, table=rel.target, axis=rel2.target))
                     
+    profiler.end(stage)
+
+    stage = profiler.begin('EFM','6.9',error_log)
     for doc in instance.dts.documents:
         if not is_extension_document(instance,doc):
             continue
@@ -1308,7 +1580,7 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
         for schema_location in doc.schema_location_attributes:
             if schema_location.local_name == 'schemaLocation':
                 for uri in schema_location.normalized_value.split()[1::2]:
-                    if not re_href.fullmatch(uri):
+                    if not is_valid_href(uri):
                         error_log.report(xbrl.Error.create('[EFM.6.3.6] {uri} in attribute {schemaLocation} on {elem} must be a standard schema or a relative filename optionally followed by a shorthard xpointer.', location='uri', uri=xml.Error.Param(uri,location=schema_location), schemaLocation=schema_location, elem=doc.document_element))
     
         if isinstance(doc, xbrl.taxonomy.LinkbaseDocument):
@@ -1316,16 +1588,16 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
         
             # 6.3.6 The URI content of the xlink:href attribute, the xsi:schemaLocation attribute and the schemaLocation attribute must be relative and contain no forward slashes, or a recognized external location of a standard taxonomy schema file, or a '#' followed by a shorthand xpointer.
             for roleref in linkbase.role_refs:
-                if not re_href.fullmatch(roleref.xlink_href):
+                if not is_valid_href(roleref.xlink_href):
                     href = roleref.element.find_attribute(('href',xlink_namespace))
                     error_log.report(xbrl.Error.create('[EFM.6.3.6] {href:value} in attribute {href} on {roleRef} must be a standard schema or a relative filename optionally followed by a shorthard xpointer.', location='href:value', href=href, roleRef=roleref))
             for arcroleref in linkbase.arcrole_refs:
-                if not re_href.fullmatch(arcroleref.xlink_href):
+                if not is_valid_href(arcroleref.xlink_href):
                     href = arcroleref.element.find_attribute(('href',xlink_namespace))
                     error_log.report(xbrl.Error.create('[EFM.6.3.6] {href:value} in attribute {href} on {arcroleRef} must be a standard schema or a relative filename optionally followed by a shorthard xpointer.', location='href:value', href=href, arcroleRef=arcroleref))
             for link in linkbase.extended_links:
                 for loc in link.locators:
-                    if not re_href.fullmatch(loc.xlink_href):
+                    if not is_valid_href(loc.xlink_href):
                         href = loc.element.find_attribute(('href',xlink_namespace))
                         error_log.report(xbrl.Error.create('[EFM.6.3.6] {href:value} in attribute {href} on locator {loc} must be a standard schema or a relative filename optionally followed by a shorthard xpointer.', location='href:value', href=href, loc=loc))
                     
@@ -1429,11 +1701,11 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
                         if order is None or not order.specified:
                             error_log.report(xbrl.Error.create('[EFM.6.16.1] Definition arc {arc} must have an order attribute.', arc=arc))
 
-    presentation_networks = []
-    for presentation_role in instance.dts.presentation_link_roles():
-        baseset = instance.dts.presentation_base_set(presentation_role)
-        network = baseset.network_of_relationships()
-        presentation_networks.append(network)
+    profiler.end(stage)
+
+    stage = profiler.begin('EFM','6.12',error_log)
+    presentation_networks, presentation_concept_networks = presentation_role_index(instance.dts)
+    for presentation_role, baseset, network in presentation_networks:
         
         # 6.12.2 All effective presentation relationships in the same base set with the same source element must have distinct values of the order attribute.
         source_to_relationship = {}
@@ -1475,13 +1747,9 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
         unitRefs = set()
         localNames = set()
         for rel in network.relationships:
-            if isinstance(rel.source,xbrl.taxonomy.Item) and not rel.source.abstract and rel.source.is_numeric():
-                for fact in instance.facts.filter(rel.source):
-                    unitRefs.add(fact.unitRef)
+            unitRefs.update(unitrefs.get(rel.source,()))
             localNames.add(rel.source.name)
-            if isinstance(rel.target,xbrl.taxonomy.Item) and not rel.target.abstract and rel.target.is_numeric():
-                for fact in instance.facts.filter(rel.target):
-                    unitRefs.add(fact.unitRef)
+            unitRefs.update(unitrefs.get(rel.target,()))
             localNames.add(rel.target.name)
         if unitRefs and not unitRefs.isdisjoint(localNames):
             unitRefs -= localNames
@@ -1489,6 +1757,9 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
                 unit = instance.unit(unitRef)
                 error_log.report(xbrl.Error.create('[EFM.6.12.9] Presentation relationship base set with linkrole {linkrole} should contain an ordering for unit {unit}.', severity=xml.ErrorSeverity.WARNING, location=unit, linkrole=baseset.role, unit=unit))
 
+    profiler.end(stage)
+
+    stage = profiler.begin('EFM','6.14',error_log)
     for calculation_role in instance.dts.calculation_link_roles():
         network = instance.dts.calculation_base_set(calculation_role).network_of_relationships()
         
@@ -1498,9 +1769,12 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
                 error_log.report(xbrl.Error.create('[EFM.6.14.3] The source {source} and target {target} of relationship {arc} must have equal values of xbrli:periodType attribute.', location=rel.arc, arc=rel.arc, source=rel.source, target=rel.target))
                 
             # 6.14.5 If an instance contains non-empty facts for the source and target of an effective calculation relationship, then at least one effective presentation relationship that the source and target appear in (because of 6.12.3) must be either (a) a relationship with each other or (b) two relationships with any other elements that share a single extended link role.
-            if used_concepts.get(rel.source,False) and used_concepts.get(rel.target,False) and not has_concepts_in_presentation_linkbase(instance.dts,rel.source,rel.target):
+            if used_concepts.get(rel.source,False) and used_concepts.get(rel.target,False) and not has_concepts_in_presentation_linkbase(presentation_concept_networks,rel.source,rel.target):
                 error_log.report(xbrl.Error.create('[EFM.6.14.5] The source {source} and target {target} of calculation relationship {arc} must also have effective presentation relationships with the same extended link role.', location=rel.arc, arc=rel.arc, source=rel.source, target=rel.target))
             
+    profiler.end(stage)
+
+    stage = profiler.begin('EFM','6.10',error_log,lambda: len(used_concepts))
     for concept in used_concepts.keys():
         labels = {}
         translated_roles = {}
@@ -1523,38 +1797,29 @@ def validate(uri, instance, error_log, params={}, catalog=xml.Catalog.root_catal
                 error_log.report(xbrl.Error.create('[EFM.6.10.3] Concept {concept} having label {label} with language {lang:value} and role {role:value} must be also linked to an \'en-US\' label resource with the same role.', location=concept, concept=concept, lang=lang, role=role, label=label))
 
         # 6.12.3 An element used in an instance must participate in at least one effective presentation relationship in the DTS of that instance.
-        participates_in_presentation_relationship = False
-        for network in presentation_networks:
-            if len(list(network.relationships_from(concept))) or len(list(network.relationships_to(concept))):
-                participates_in_presentation_relationship = True
-                break
-        if not participates_in_presentation_relationship:
+        if concept not in presentation_concept_networks:
             facts = instance.facts.filter(concept)
             if len(facts):
                 error_log.report(xbrl.Error.create('[EFM.6.12.3] Concept {concept} reported as fact {fact} must participate in at least one effective presentation relationship.', location=concept, concept=concept, fact=facts[0]))
-            else:
-                try:
-                    for context in instance.contexts:
-                        if context.entity.segment:
-                            for member in context.entity.segment.explicit_members:
-                                if member.value == concept:
-                                    raise StopIteration
-                except StopIteration:           
-                    error_log.report(xbrl.Error.create('[EFM.6.12.3] Concept {concept} referred to by context {context} in {explicitMember} must participate in at least one effective presentation relationship.', location=concept, concept=concept, context=context, explicitMember=member))
+            elif concept in member_references:
+                context, member = member_references[concept]
+                error_log.report(xbrl.Error.create('[EFM.6.12.3] Concept {concept} referred to by context {context} in {explicitMember} must participate in at least one effective presentation relationship.', location=concept, concept=concept, context=context, explicitMember=member))
 
         # 6.12.5 If an element used in an instance is the target in the instance DTS of more than one effective presentation relationship in a base set with the same source element, then the presentation relationships must have distinct values of the preferredLabel attribute.
-        source_to_relationship = {}
-        for rel in network.relationships_to(concept):
-            if (rel.source,rel.preferred_label) in source_to_relationship:
-                rel2 = source_to_relationship[(rel.source,rel.preferred_label)]
-                error_log.report(xbrl.Error.create('[EFM.6.12.5] Presentation arcs {arc} and {arc2} in the same base set with the same source and target must have distinct values of the preferredLabel attribute.', arc=rel.arc, arc2=rel2.arc))
-            else:
-                source_to_relationship[(rel.source,rel.preferred_label)] = rel
+        for index in presentation_concept_networks.get(concept,()):
+            source_to_relationship = {}
+            for rel in presentation_networks[index][2].relationships_to(concept):
+                if (rel.source,rel.preferred_label) in source_to_relationship:
+                    rel2 = source_to_relationship[(rel.source,rel.preferred_label)]
+                    error_log.report(xbrl.Error.create('[EFM.6.12.5] Presentation arcs {arc} and {arc2} in the same base set with the same source and target must have distinct values of the preferredLabel attribute.', arc=rel.arc, arc2=rel2.arc))
+                else:
+                    source_to_relationship[(rel.source,rel.preferred_label)] = rel
                                 
     validate_labels(instance,error_log)
+    profiler.end(stage)
     
     if params.get('enableDqcValidation', 'false') == 'true':
-        dqc_validation.validate(instance,error_log,params)
+        dqc_validation.validate(instance,error_log,params,profiler)
                     
 # Main entry point, will be called by RaptorXML after the DTS discovery from XBRL instance has finished
 def on_xbrl_finished_dts(job, dts):
@@ -1566,8 +1831,7 @@ def on_xbrl_finished_dts(job, dts):
         else:
             uri_edgar_taxonomies = job.script_params.get('edgar-taxonomies-url',urljoin('file:',pathname2url(os.path.join(os.path.dirname(__file__),'edgartaxonomies.xml'))))
 
-            edgar_version, standard_taxonomies = parse_edgar_taxonomies(uri_edgar_taxonomies,job.catalog,job.error_log)
-            standard_namespaces = dict([(entry['Namespace'],entry['Href']) for entry in standard_taxonomies if entry['AttType'] == 'SCH'])
+            standard_namespaces = load_standard_taxonomies(uri_edgar_taxonomies,job.catalog,job.error_log).namespaces
         
             bEnableUTR = False
             for ns in standard_namespaces:
@@ -1578,4 +1842,6 @@ def on_xbrl_finished_dts(job, dts):
                 
 # Main entry point, will be called by RaptorXML after the XBRL instance validation job has finished
 def on_xbrl_finished(job, instance):
-    validate(job.input_filenames[0], instance, job.error_log, job.script_params, job.catalog)
+    profiler = validate(job.input_filenames[0], instance, job.error_log, job.script_params, job.catalog)
+    if profiler.enabled:
+        validation_profiler.write_sidecar(job, profiler, job.script_params.get('profileFile', 'efm_profile.json'))
@@ -0,0 +1,110 @@
+# Copyright 2015 Altova GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+__copyright__ = "Copyright 2015 Altova GmbH"
+__license__ = 'http://www.apache.org/licenses/LICENSE-2.0'
+__version__ = '1.0'
+
+# This module implements the concept label cache shared by the validation scripts and the sec_*.py report generators.
+# Label texts are cached per (concept, label role, language) with least recently used eviction once the cache holds maxsize entries.
+# Each job looks up labels within its own scope, so that no labels or concept objects are kept across jobs and filings. The scope is bound to the thread which entered it, other threads look up labels without caching.
+# The cache works with the concept objects of the RaptorXML Python API but does not import it.
+
+import collections,contextlib,threading
+
+concept_label_arcrole = 'http://www.xbrl.org/2003/arcrole/concept-label'
+
+class LabelCache(object):
+    """Bounded LRU cache of the text of the first label of a concept for a given label role and language."""
+
+    def __init__(self,maxsize=8192):
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _store(self,key,text):
+        with self.lock:
+            self.entries[key] = text
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def label(self,concept,label_role=None,lang=None):
+        """Returns the text of the first label of concept with the given label role and language or None if there is no such label. If label_role or lang is None, labels of any role or language are considered."""
+        key = (concept,label_role,lang)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        text = lookup(concept,label_role,lang)
+        self._store(key,text)
+        return text
+
+    def prewarm(self,dts,concepts,lang=None):
+        """Resolves the labels of all roles with the given xml:lang for each of the concepts with a single pass over the effective concept-label relationships of the DTS."""
+        wanted = set(concepts)
+        texts = {}
+        for baseset in dts.base_sets:
+            if baseset.arcrole == concept_label_arcrole:
+                for rel in baseset.network_of_relationships().relationships:
+                    if rel.source in wanted and (lang is None or rel.target.xml_lang == lang):
+                        texts.setdefault((rel.source,rel.target.xlink_role,lang),rel.target.text)
+        for key, text in texts.items():
+            self._store(key,text)
+
+    def clear(self):
+        """Removes all entries from the cache."""
+        with self.lock:
+            self.entries.clear()
+
+def lookup(concept,label_role=None,lang=None):
+    """Returns the text of the first label of concept with the given label role and language or None if there is no such label without caching it."""
+    kargs = {}
+    if label_role is not None:
+        kargs['label_role'] = label_role
+    if lang is not None:
+        kargs['lang'] = lang
+    return next((label.text for label in concept.labels(**kargs)),None)
+
+_local = threading.local()
+
+@contextlib.contextmanager
+def scope(maxsize=8192):
+    """Context manager which caches the labels looked up by label() in the current thread in a new LabelCache. The cache is discarded when the block is left."""
+    previous = getattr(_local,'cache',None)
+    _local.cache = LabelCache(maxsize)
+    try:
+        yield _local.cache
+    finally:
+        _local.cache = previous
+
+def current():
+    """Returns the LabelCache of the innermost scope entered by the current thread or None."""
+    return getattr(_local,'cache',None)
+
+def label(concept,label_role=None,lang=None):
+    """Returns the text of the first label of concept with the given label role and language or None if there is no such label. Outside of a scope the label is not cached."""
+    cache = current()
+    if cache is None:
+        return lookup(concept,label_role,lang)
+    return cache.label(concept,label_role,lang)
+
+def prewarm(dts,concepts,lang=None):
+    """Resolves the labels of the given concepts into the cache of the current scope. Does nothing outside of a scope."""
+    cache = current()
+    if cache is not None:
+        cache.prewarm(dts,concepts,lang)
@@ -0,0 +1,100 @@
+# Copyright 2015 Altova GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+__copyright__ = "Copyright 2015 Altova GmbH"
+__license__ = 'http://www.apache.org/licenses/LICENSE-2.0'
+__version__ = '1.0'
+
+# This module implements the graph algorithms used by the relationship network checks in efm_validation.py.
+# A graph is a dict mapping each node to a list of (target, edge) tuples, e.g. the concepts of a network of relationships to their outgoing relationships.
+# All algorithms are iterative, so that deep networks do not hit the recursion limit of Python, and run in time linear in the size of the graph.
+
+import collections
+
+def from_network(network):
+    """Returns the graph of a network of relationships with the source concepts mapped to (target concept, relationship) tuples."""
+    graph = {}
+    for rel in network.relationships:
+        graph.setdefault(rel.source,[]).append((rel.target,rel))
+    return graph
+
+def strongly_connected_components(graph):
+    """Returns the strongly connected components of the graph as lists of nodes using Tarjan's algorithm."""
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in graph:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root,iter(graph[root]))]
+        while work:
+            node, edges = work[-1]
+            for target, edge in edges:
+                if target not in index:
+                    index[target] = lowlink[target] = len(index)
+                    stack.append(target)
+                    on_stack.add(target)
+                    work.append((target,iter(graph.get(target,()))))
+                    break
+                elif target in on_stack:
+                    lowlink[node] = min(lowlink[node],index[target])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent],lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+def find_cycle(graph, component):
+    """Returns the edges of a shortest cycle through the first node of the strongly connected component or an empty list if the component has no cycle."""
+    members = set(component)
+    start = component[0]
+    parents = {}
+    queue = collections.deque([start])
+    while queue:
+        node = queue.popleft()
+        for target, edge in graph.get(node,()):
+            if target == start:
+                cycle = [edge]
+                while node != start:
+                    node, edge = parents[node]
+                    cycle.append(edge)
+                cycle.reverse()
+                return cycle
+            if target in members and target not in parents:
+                parents[target] = (node,edge)
+                queue.append(target)
+    return []
+
+def directed_cycles(graph):
+    """Returns a list with the edges of one cycle for each strongly connected component of the graph which contains a cycle."""
+    cycles = []
+    for component in strongly_connected_components(graph):
+        cycle = find_cycle(graph,component)
+        if cycle:
+            cycles.append(cycle)
+    return cycles
@@ -21,9 +21,12 @@ __license__ = 'http://www.apache.org/licenses/LICENSE-2.0'
 # Example invocation:
 #   raptorxmlxbrl valxbrl --script=sec_filing_to_xlsx.py nanonull.xbrl
 
-import os, datetime, itertools
+import os, sys, datetime, itertools
 from altova import *
 
+sys.path.append(os.path.dirname(__file__))
+import label_cache
+
 try:
     import xlsxwriter
 except:
@@ -134,7 +137,7 @@ def calcTableData(instance,role,contexts,concepts,dimensions):
             if len(facts):
                 bEmpty = False
                 if bIsCashFlow and not bHasCash and concept[0].is_duration():
-                    bHasCash = 'cash' in next(iter(concept[0].labels(label_role=concept[1],lang=lang))).text.lower()
+                    bHasCash = 'cash' in (label_cache.label(concept[0],concept[1],lang) or '').lower()
             column['rows'].append({'concept': concept, 'facts': facts})
 
         if not bEmpty and (not bIsCashFlow or bHasCash):
@@ -144,9 +147,9 @@ def calcTableData(instance,role,contexts,concepts,dimensions):
 
 def formatConcept(concept):
     preferredLabel = concept[1] if concept[1] else 'http://www.xbrl.org/2003/role/label'
-    labels = list(concept[0].labels(label_role=preferredLabel,lang=lang))
-    if labels:
-        return labels[0].text
+    text = label_cache.label(concept[0],preferredLabel,lang)
+    if text is not None:
+        return text
     return str(concept[0].qname)
 
 def formatPeriod(period):
@@ -179,8 +182,9 @@ def formatFact(dts,fact,preferredLabel=None):
     elif fact.concept.is_qname():
         concept = dts.resolve_concept(fact.qname_value)
         if concept:
-            for label in concept.labels():
-                return (label.text,None)
+            text = label_cache.label(concept)
+            if text is not None:
+                return (text,None)
         return (str(fact.qname_value),None)
     else:
         return (fact.normalized_value,None)
@@ -254,10 +258,15 @@ def generateTables(path, dts, instance):
     contexts = list(instance.contexts)
     roles = [(role, dts.role_type(role).definition.value) for role in dts.presentation_link_roles()]
     roles = sorted(roles, key=lambda role: role[1].split(' - ')[0])
+    trees = {}
     for role in roles:
         presentation_network = dts.presentation_base_set(role[0]).network_of_relationships()
         roots = list(presentation_network.roots)
-        tables[role] = calcTableData(instance,role,contexts,*analyzePresentationTree(presentation_network,roots))
+        trees[role] = analyzePresentationTree(presentation_network,roots)
+    # Resolve the labels of the concepts of all tables in one pass over the label relationships
+    label_cache.prewarm(dts,[concept[0] for concepts, dimensions in trees.values() for concept in concepts],lang)
+    for role in roles:
+        tables[role] = calcTableData(instance,role,contexts,*trees[role])
 
     # Generate excel sheet for each non-empty table
     for role in roles:
@@ -271,6 +280,7 @@ def on_xbrl_finished(job, instance):
     # instance object will be None if XBRL 2.1 validation was not successful
     if instance:
         path = os.path.join(job.output_dir,'table.xlsx')
-        generateTables(path, instance.dts, instance)
+        with label_cache.scope():
+            generateTables(path, instance.dts, instance)
         # Register new output file with RaptorXML engine
         job.append_output_filename(path)
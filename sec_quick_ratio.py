@@ -21,19 +21,21 @@ __license__ = 'http://www.apache.org/licenses/LICENSE-2.0'
 #   raptorxmlxbrl valxbrl --script=sec_quick_ratio.py nanonull.xbrl
 
 
-import re
+import os, re, sys
 from altova import *
 
+sys.path.append(os.path.dirname(__file__))
+import label_cache
+
 def concept_label(concept, label_role=None):
     if not label_role:
         label_role = xbrl.taxonomy.ROLE_LABEL
-    # Find all labels matching the given criteria
-    labels = list(concept.labels(label_role=label_role, lang='en'))
-    if not labels:
+    # Find the text of the first label matching the given criteria
+    text = label_cache.label(concept, label_role, 'en')
+    if text is None:
         # If not labels are found fallback to concept QName
         return str(concept.qname)
-    # Return text of first label found
-    return labels[0].text
+    return text
 
 def find_namespaces(dts):
     # Determine dei and us-gaap namespaces (the namespaces will vary depending on the version of the US-GAAP taxonomy used)
@@ -114,4 +116,5 @@ def calc_quick_ratio(instance, error_log):
 def on_xbrl_finished(job, instance):
     # instance object will be None if XBRL 2.1 validation was not successful
     if instance:
-        calc_quick_ratio(instance, job.error_log)
+        with label_cache.scope():
+            calc_quick_ratio(instance, job.error_log)
@@ -0,0 +1,100 @@
+# Copyright 2015 Altova GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+__copyright__ = "Copyright 2015 Altova GmbH"
+__license__ = 'http://www.apache.org/licenses/LICENSE-2.0'
+__version__ = '1.0'
+
+# This module implements the optional instrumentation of the efm_validation.py and dqc_validation.py scripts which is enabled with the profile script parameter.
+# For each DQC rule and each EFM section the wall time, the number of facts examined, the number of errors emitted and the peak of the memory allocated during the stage on top of the memory in use when it starts are recorded and written to a JSON file.
+# Peak allocations are tracked process-wide with the tracemalloc module and are therefore only attributable to a single DQC rule if the rules are not executed concurrently (maxWorkers:1).
+
+import contextlib,json,os,threading,time,tracemalloc
+
+def is_enabled(params):
+    """Returns True if profiling is enabled by the profile script parameter."""
+    return params.get('profile', 'false') == 'true'
+
+def error_count(error_log):
+    """Returns the number of errors in a RaptorXML error log or a DeferredErrorLog."""
+    try:
+        return len(error_log)
+    except TypeError:
+        return sum(1 for error in error_log.errors)
+
+class Profiler(object):
+    """Records a list of measurements for named validation stages. A disabled profiler records nothing and adds no overhead apart from the function call."""
+
+    def __init__(self,enabled=True):
+        self.enabled = enabled
+        self.records = []
+        self.lock = threading.Lock()
+        self.started_tracemalloc = False
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+
+    def begin(self,section,name,error_log=None,facts=None):
+        """Starts measuring stage name of the given section (e.g. 'DQC' or 'EFM') and returns the state to be passed to end(). If error_log is given, the number of errors emitted until end() is recorded. facts is either the number of facts examined, a callable returning it when the stage ends or None if the stage does not examine facts one by one."""
+        if not self.enabled:
+            return None
+        errors_before = error_count(error_log) if error_log is not None else None
+        if hasattr(tracemalloc,'reset_peak'):
+            tracemalloc.reset_peak()
+        memory_before = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        return (section,name,error_log,facts,errors_before,memory_before,time.perf_counter())
+
+    def end(self,state):
+        """Finishes measuring the stage started by begin() and records the measurements."""
+        if state is None:
+            return
+        section, name, error_log, facts, errors_before, memory_before, start = state
+        wall_time = time.perf_counter() - start
+        record = {
+            'section': section,
+            'name': name,
+            'wallTime': wall_time,
+            'facts': facts() if callable(facts) else facts,
+            'errors': error_count(error_log) - errors_before if error_log is not None else None,
+            'peakMemory': tracemalloc.get_traced_memory()[1] - memory_before if memory_before is not None and tracemalloc.is_tracing() else None,
+        }
+        with self.lock:
+            self.records.append(record)
+
+    @contextlib.contextmanager
+    def stage(self,section,name,error_log=None,facts=None):
+        """Context manager which measures the enclosed block with begin() and end()."""
+        state = self.begin(section,name,error_log,facts)
+        try:
+            yield
+        finally:
+            self.end(state)
+
+    def write(self,path):
+        """Writes all records as JSON to the given file."""
+        with open(path,'w') as f:
+            json.dump({'stages': self.records},f,indent=2)
+
+    def close(self):
+        """Stops tracing memory allocations if it has been started by this profiler."""
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+disabled = Profiler(enabled=False)
+
+def write_sidecar(job,profiler,filename):
+    """Writes the records of the profiler to filename in the output directory of the RaptorXML job and registers it as an output file of the job."""
+    path = os.path.join(job.output_dir,filename)
+    profiler.write(path)
+    job.append_output_filename(path)
@@ -0,0 +1,82 @@
+# Copyright 2015 Altova GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+__copyright__ = "Copyright 2015 Altova GmbH"
+__license__ = 'http://www.apache.org/licenses/LICENSE-2.0'
+__version__ = '1.0'
+
+# This module implements the decimals-aware comparison of numeric fact values shared by the efm_validation.py and dqc_validation.py scripts.
+# Values are decimal.Decimal objects and decimals are integers or float('inf') as returned by the decimals property of numeric facts.
+# Integral values with decimals <= 0 (e.g. values reported in thousands or millions) are rounded with int arithmetic instead of decimal.Decimal scaling and quantization.
+
+import decimal
+
+INF = float('inf')
+
+_powers_of_ten = [10**i for i in range(32)]
+_tolerances = {}
+
+def pow10(n):
+    """Returns 10 to the power of the non-negative integer n."""
+    return _powers_of_ten[n] if n < len(_powers_of_ten) else 10**n
+
+def _round_int(value,digits):
+    """Rounds the int value to a multiple of 10**digits using round half to nearest even."""
+    p = pow10(digits)
+    # Floor division yields the lower candidate q*p for negative values as well, so ties are resolved by the parity of q alone.
+    q, r = divmod(value,p)
+    r += r
+    if r > p or (r == p and q & 1):
+        q += 1
+    return q*p
+
+def round_decimals(value,decimals):
+    """Rounds the decimal.Decimal value to the given decimals using round half to nearest even as specified by XBRL. The result is an int if the integer fast path applies, otherwise a decimal.Decimal."""
+    if decimals == INF or not value.is_finite():
+        return value
+    if decimals <= 0:
+        int_value = int(value)
+        if int_value == value:
+            return _round_int(int_value,-decimals) if decimals else int_value
+    return value.scaleb(decimals).quantize(1,decimal.ROUND_HALF_EVEN).scaleb(-decimals)
+
+def compare(value1,decimals1,value2,decimals2,cmp):
+    """Rounds both values to the least accurate decimals of both and calls the given cmp function with the rounded values and the decimals. If both values are infinitely precise, cmp is called with the unrounded values only."""
+    # When comparing two numeric fact values in a rule, the comparison needs to take into account different decimals. Numbers are compared based on the lowest decimal value rounded per XBRL specification. For example, the number 532,000,000 with decimals of -6 is considered to be equivalent to 532,300,000 with a decimals value of -5. In this case the 532,300,000 is rounded to a million and then compared to the value of 532,000,000. (Note that XBRL specifies "round half to nearest even" so 532,500,000 with decimals -6 rounds to 532,000,000, and 532,500,001 rounds to 533,000,000.)
+    decimals = decimals1 if decimals1 < decimals2 else decimals2
+    if decimals == INF:
+        return cmp(value1,value2)
+    return cmp(round_decimals(value1,decimals),round_decimals(value2,decimals),decimals)
+
+def tolerance(decimals):
+    """Returns the rounding tolerance of 2 in the scale of the given decimals."""
+    value = _tolerances.get(decimals)
+    if value is None:
+        value = 2*pow10(-decimals) if decimals <= 0 else decimal.Decimal(2).scaleb(-decimals)
+        _tolerances[decimals] = value
+    return value
+
+def equal(val1,val2,decimals=None):
+    """Returns true if val1 is equal to val2."""
+    return val1 == val2
+
+def equal_within_tolerance(val1,val2,decimals=None):
+    """Returns true if va1 is equal to val2 within given tolerance."""
+    # The rule allows a tolerance for rounding between the values tested of 2 based on the scale of the values. For example, if the values are reported in millions, the rounding tolerance would be $2 million.
+    if decimals is None:
+        return val1 == val2
+    return abs(val1-val2) <= tolerance(decimals)
+
+def less_or_equal(val1,val2,decimals=None):
+    """Returns true if va1 is less or equal than val2."""
+    return val1 <= val2